@@ -0,0 +1,78 @@
+"""Search-as-you-type latency on a large playlist.
+
+Builds a PlaylistStore of N synthetic tracks, then replays typing a few
+queries one keystroke at a time. Each keystroke is one PlaylistStore.search
+call, the same call the search box makes. The index is built on the first
+search and that build is reported separately. The per-keystroke budget is 5 ms.
+
+    python benchmarks/bench_search.py
+    python benchmarks/bench_search.py --tracks 200000 --limit 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from playlist_store import PlaylistStore  # noqa: E402
+from track import Track  # noqa: E402
+
+BUDGET_MS = 5.0
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "to", "vi", "zen", "bel", "dor", "fan", "gri", "hul", "jor", "qua", "é", "ño"]
+QUERIES = ["nocturne", "love song", "artist 1234", "a", "live 2009", "beyonce", "xyzzy", "the dark side"]
+
+
+def word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def make_tracks(count, seed=0):
+    rng = random.Random(seed)
+    vocab = [word(rng) for _ in range(20000)] + ["Nocturne", "Love", "Song", "Live", "The", "Dark", "Side", "Beyoncé"]
+    tracks = []
+    for i in range(count):
+        n = i % 12 + 1
+        title = " ".join(rng.choice(vocab) for _ in range(rng.randint(1, 5)))
+        artist = f"Artist {i // 120}"
+        path = f"/Music/{artist}/Album {i // 12}/{n:02d} - {title}.flac"
+        tracks.append(Track(path, title, artist, 200000.0 + i, "FLAC", n))
+    return tracks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tracks", type=int, default=200_000)
+    parser.add_argument("--limit", type=int, default=200, help="results shown per query (None: all)")
+    parser.add_argument("--sort", default="Title")
+    args = parser.parse_args()
+
+    store = PlaylistStore(make_tracks(args.tracks))
+    store.sort(args.sort)
+    store.position(0) # Build the inverse permutation up front, as after any sort switch
+
+    start = time.perf_counter()
+    store.search("warmup")
+    print(f"{args.tracks} tracks, index build {(time.perf_counter() - start) * 1000:.0f} ms, limit {args.limit}")
+
+    times = []
+    for query in QUERIES:
+        worst = 0.0
+        for n in range(1, len(query) + 1):
+            start = time.perf_counter()
+            hits = store.search(query[:n], limit=args.limit)
+            ms = (time.perf_counter() - start) * 1000
+            times.append(ms)
+            worst = max(worst, ms)
+        print(f"  {query!r:<16} {len(hits or ()):>5} hits  worst keystroke {worst:6.2f} ms")
+
+    times.sort()
+    p50 = times[len(times) // 2]
+    p99 = times[min(len(times) - 1, int(len(times) * 0.99))]
+    print(f"keystrokes: {len(times)}  p50 {p50:.2f} ms  p99 {p99:.2f} ms  max {times[-1]:.2f} ms")
+    print("PASS" if times[-1] < BUDGET_MS else f"FAIL: over the {BUDGET_MS} ms budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Sorting a playlist by each dropdown key: per-sort regex keys vs cached keys.
+
+"before" is the old sort_playlist path: a list of Track sorted with a key
+function that runs re.split on every title/filename on every sort. "after" is
+PlaylistStore, whose natural sort keys are computed once when rows are added
+(reported separately as the build cost) and reused by every sort.
+
+    python benchmarks/bench_sort_keys.py
+    python benchmarks/bench_sort_keys.py --tracks 100000 --repeat 5
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from playlist_store import PlaylistStore  # noqa: E402
+from track import Track  # noqa: E402
+
+SORT_KEYS = ("File Name", "Title", "Track Number")
+WORDS = ["Nocturne", "Étude", "Symphony", "Prelude", "Sonata", "Ｌive", "Interlude", "Reprise"]
+
+
+def old_natural_sort_key(s):
+    # The key function as it was before precomputed keys
+    return [int(text) if text.isdigit() else text.lower()
+            for text in re.split('([0-9]+)', str(s))]
+
+
+def old_sort(tracks, sort_key):
+    if sort_key == "Title":
+        tracks.sort(key=lambda x: old_natural_sort_key(x.title))
+    elif sort_key == "Track Number":
+        tracks.sort(key=lambda x: (x.track, old_natural_sort_key(x.title)))
+    else:
+        tracks.sort(key=lambda x: old_natural_sort_key(x.filename))
+
+
+def make_tracks(count, seed=0):
+    rng = random.Random(seed)
+    tracks = []
+    for i in range(count):
+        n = rng.randint(1, 24)
+        title = f"{rng.choice(WORDS)} No. {rng.randint(1, 300)} in {rng.choice('ABCDEFG')}"
+        path = f"/Music/Artist {i // 120}/Album {i // 12}/{n:02d} - {title}.flac"
+        tracks.append(Track(path, title, f"Artist {i // 120}", 200000.0 + i, "FLAC", n))
+    rng.shuffle(tracks)
+    return tracks
+
+
+def best_of(repeat, fn):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tracks", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tracks = make_tracks(args.tracks)
+    start = time.perf_counter()
+    store = PlaylistStore(tracks)
+    build = (time.perf_counter() - start) * 1000
+
+    print(f"{args.tracks} tracks, best of {args.repeat}")
+    print(f"PlaylistStore build (keys computed once): {build:8.1f} ms")
+    for sort_key in SORT_KEYS:
+        before = best_of(args.repeat, lambda: old_sort(list(tracks), sort_key))
+        after = best_of(args.repeat, lambda: store.sorted_order(sort_key))
+        print(f"{sort_key:<13} before {before:8.1f} ms   after {after:8.1f} ms   x{before / after:.1f}")
+
+
+if __name__ == "__main__":
+    main()
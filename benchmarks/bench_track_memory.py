@@ -0,0 +1,78 @@
+"""Bytes per playlist entry: the old 7-key dict vs track.Track.
+
+Builds N entries the way extract_metadata does (fresh strings per file, so
+artist and ext are separate objects unless interned) and measures the heap
+with tracemalloc.
+
+    python benchmarks/bench_track_memory.py
+    python benchmarks/bench_track_memory.py --tracks 200000
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from track import Track  # noqa: E402
+
+TRACKS_PER_ALBUM = 12
+ALBUMS_PER_ARTIST = 5
+
+
+def fake_file(i):
+    # Strings are rebuilt per call, like tag decoding does
+    artist = i // (TRACKS_PER_ALBUM * ALBUMS_PER_ARTIST)
+    album = i // TRACKS_PER_ALBUM
+    n = i % TRACKS_PER_ALBUM + 1
+    filename = f"{n:02d} - Some Fairly Typical Track Title {i}.flac"
+    path = f"/storage/emulated/0/Music/Artist Name {artist}/Album Title {album}/{filename}"
+    return path, filename, f"Some Fairly Typical Track Title {i}", "".join(["Artist Name ", str(artist)]), "flac".upper(), n
+
+
+def make_dict(i):
+    path, filename, title, artist, ext, n = fake_file(i)
+    return {
+        "path": path,
+        "title": title,
+        "artist": artist,
+        "duration": 241000.0 + i,
+        "ext": ext,
+        "filename": filename,
+        "track": n
+    }
+
+
+def make_track(i):
+    path, filename, title, artist, ext, n = fake_file(i)
+    return Track(path, title, artist, 241000.0 + i, ext, n)
+
+
+def measure(factory, count):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = [factory(i) for i in range(count)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del items
+    return (after - before) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tracks", type=int, default=200_000)
+    args = parser.parse_args()
+
+    old = measure(make_dict, args.tracks)
+    new = measure(make_track, args.tracks)
+    print(f"{args.tracks} tracks (list included)")
+    print(f"dict  : {old:7.1f} bytes/track  {old * args.tracks / 1048576:7.1f} MB")
+    print(f"Track : {new:7.1f} bytes/track  {new * args.tracks / 1048576:7.1f} MB")
+    print(f"saved : {100 * (1 - new / old):.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Compare the old os.walk folder scan with walker.LibraryWalker.
+
+Builds a synthetic library (default 500k entries: directories, audio files and
+the usual cover/cue/log clutter) in a temp dir and times both walks, with and
+without the size/mtime lookup an incremental rescan needs.
+
+    python benchmarks/bench_walker.py
+    python benchmarks/bench_walker.py --entries 50000 --root /mnt/nas/tmp
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from metadata import SUPPORTED_EXT  # noqa: E402
+from walker import LibraryWalker  # noqa: E402
+
+AUDIO_PER_ALBUM = 12
+CLUTTER = ("cover.jpg", "folder.jpg", "album.cue", "rip.log", "notes.txt", "Thumbs.db")
+
+
+def build_tree(root, entries):
+    # artist/album/NN - track.flac plus clutter; every 20th album gets an @eaDir
+    made = 0
+    artist = 0
+    while made < entries:
+        artist_dir = os.path.join(root, f"Artist {artist:05d}")
+        os.mkdir(artist_dir)
+        made += 1
+        for album in range(5):
+            album_dir = os.path.join(artist_dir, f"Album {album}")
+            os.mkdir(album_dir)
+            made += 1
+            for n in range(AUDIO_PER_ALBUM):
+                ext = SUPPORTED_EXT[(artist + n) % len(SUPPORTED_EXT)]
+                open(os.path.join(album_dir, f"{n + 1:02d} - Track{ext}"), "wb").close()
+            for name in CLUTTER:
+                open(os.path.join(album_dir, name), "wb").close()
+            made += AUDIO_PER_ALBUM + len(CLUTTER)
+            if (artist * 5 + album) % 20 == 0:
+                # Synology index: one folder per track holding its metadata blob
+                ea = os.path.join(album_dir, "@eaDir")
+                os.mkdir(ea)
+                for n in range(AUDIO_PER_ALBUM):
+                    track_dir = os.path.join(ea, f"{n + 1:02d} - Track.flac")
+                    os.mkdir(track_dir)
+                    open(os.path.join(track_dir, "SYNOINDEX_MEDIA_INFO"), "wb").close()
+                made += 2 * AUDIO_PER_ALBUM + 1
+            if made >= entries:
+                break
+        artist += 1
+    return made
+
+
+def old_walk(path):
+    # The loop that used to live in on_folder_picked
+    found = []
+    for root, dirs, files in os.walk(path):
+        for file in files:
+            full_path = os.path.join(root, file)
+            if file.lower().endswith(SUPPORTED_EXT):
+                found.append(full_path)
+    return found
+
+
+def old_walk_stat(path):
+    return {p: (st.st_size, st.st_mtime_ns) for p in old_walk(path) for st in (os.stat(p),)}
+
+
+def new_walk(path):
+    return [f.path for f in LibraryWalker().walk(path)]
+
+
+def new_walk_stat(path):
+    return {f.path: (f.size, f.mtime_ns) for f in LibraryWalker().walk(path)}
+
+
+def best_of(fn, path, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=500_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--root", default=None, help="parent dir for the synthetic tree")
+    parser.add_argument("--keep", action="store_true", help="don't delete the tree afterwards")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="hires_walk_", dir=args.root)
+    try:
+        start = time.perf_counter()
+        made = build_tree(tmp, args.entries)
+        print(f"Built {made} entries in {time.perf_counter() - start:.1f}s under {tmp}")
+
+        # LibraryWalker always returns size/mtime, so "os.walk + stat" is the
+        # like-for-like baseline; plain os.walk is what the UI used to do
+        for label, fn in (("os.walk (paths only)    ", old_walk),
+                          ("os.walk + os.stat       ", old_walk_stat),
+                          ("LibraryWalker (paths)   ", new_walk),
+                          ("LibraryWalker (+st data)", new_walk_stat)):
+            secs, found = best_of(fn, tmp, args.repeat)
+            print(f"{label} {secs * 1000:9.1f} ms  {found} audio files")
+    finally:
+        if args.keep:
+            print(f"Kept {tmp}")
+        else:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,17 @@
 import flet as ft
 import flet_audio as fta
-from tinytag import TinyTag
 import os
 import base64
-import re
 import asyncio
+import time
 from pathlib import Path
 
+from art_cache import ArtCache, art_cache_budget
+from art_store import ArtStore
+from metadata_cache import MetadataCache
+from playlist_store import PlaylistStore
+from scanner import DEFAULT_WORKERS, rescan_folder, scan_folder, stream_folder
+
 def main(page: ft.Page):
     # Page Configuration
     page.title = "Hi-Res Player" 
@@ -20,13 +25,22 @@ def main(page: ft.Page):
     page.window_height = 844
 
     # State variables
-    current_track = None # Dictionary
+    current_track = None # Track
     is_playing = False
     duration = 0  # in milliseconds
-    playlist = [] # List of dicts: {path, title, artist, duration, ext, filename}
+    playlist = PlaylistStore() # Columnar; playlist[i] yields a Track (path, title, artist, duration, ext, track)
     current_playlist_index = -1
     playback_rate = 1.0
     current_sort_key = "File Name"
+    scan_workers = DEFAULT_WORKERS # Threads used for metadata extraction on folder scans
+    metadata_cache = MetadataCache() # Unchanged files (same size + mtime) skip TinyTag entirely
+    library_root = None # Folder the playlist was scanned from
+    library_state = {} # path -> (size, mtime_ns) as of the last scan of library_root
+    stream_scan = True # Fresh folder picks start playing on the first file found
+    scan_generation = 0 # Bumped per streaming scan so a newer pick cancels the older one
+    scan_streaming = False # A streaming scan is filling the queue; it stays in scan order until done
+    art_cache = ArtCache(art_cache_budget(page.platform)) # Encoded art variants recently shown
+    art_store = ArtStore() # Downscaled art on disk, rendered once per distinct cover
 
     # --- HELPER FUNCTIONS ---
     def format_time(milliseconds):
@@ -36,61 +50,18 @@ def main(page: ft.Page):
         seconds = seconds % 60
         return f"{minutes}:{seconds:02d}"
 
-    def get_album_art_base64(file_path):
+    def read_file_base64(file_path):
         try:
-            tag = TinyTag.get(file_path, image=True)
-            image_data = tag.images.any
-            if image_data:
-                return base64.b64encode(image_data).decode('utf-8')
-        except Exception:
-            pass
-        return None
+            with open(file_path, "rb") as f:
+                return base64.b64encode(f.read()).decode('utf-8')
+        except OSError:
+            return None
 
-    def extract_metadata(file_path):
-        filename = os.path.basename(file_path)
-        ext = os.path.splitext(filename)[1].replace('.', '').upper()
-        
-        try:
-            tag = TinyTag.get(file_path, image=False) # Image loaded on demand
-            title = tag.title if tag.title else filename
-            artist = tag.artist if tag.artist else "Unknown Artist"
-            dur = tag.duration * 1000 if tag.duration else 0
-            
-            # Extract Track Number
-            track_num = 0
-            if tag.track:
-                try:
-                    # Handle "1/12" format
-                    t_str = str(tag.track).split('/')[0]
-                    track_num = int(t_str) if t_str.isdigit() else 0
-                except:
-                    track_num = 0
-            
-            return {
-                "path": file_path,
-                "title": title,
-                "artist": artist,
-                "duration": dur,
-                "ext": ext,
-                "filename": filename,
-                "track": track_num
-            }
-        except Exception as e:
-            print(f"Error reading {filename}: {e}")
-            return {
-                "path": file_path,
-                "title": filename,
-                "artist": "Unknown",
-                "duration": 0,
-                "ext": ext,
-                "filename": filename,
-                "track": 0
-            }
-
-    def natural_sort_key(s):
-        # Splits string into list of strings and integers: "foo20bar" -> ["foo", 20, "bar"]
-        return [int(text) if text.isdigit() else text.lower()
-                for text in re.split('([0-9]+)', str(s))]
+    def get_album_art_base64(file_path, variant="foreground"):
+        # A few KB variant from the art store instead of the full embedded image;
+        # repeat plays and skipping back and forth don't even read that file again
+        art_file = art_store.variant_path(file_path, variant)
+        return art_cache.get(art_file, read_file_base64) if art_file else None
 
     # --- EVENT HANDLERS ---
     
@@ -99,9 +70,9 @@ def main(page: ft.Page):
         if files and len(files) > 0:
             new_tracks = []
             for f in files:
-                new_tracks.append(extract_metadata(f.path))
+                new_tracks.append(metadata_cache.extract(f.path))
             
-            playlist = new_tracks
+            playlist = PlaylistStore(new_tracks)
             current_playlist_index = 0
             if playlist:
                 load_track(playlist[0])
@@ -110,25 +81,17 @@ def main(page: ft.Page):
     def on_folder_picked(path):
         nonlocal playlist, current_playlist_index
         if path:
-            supported_ext = ('.mp3', '.flac', '.wav', '.m4a', '.alac')
-            new_playlist = []
             try:
-                # Show loading? (Blocking for now, simpler)
-                for root, dirs, files in os.walk(path):
-                    for file in files:
-                        if file.lower().endswith(supported_ext):
-                            full_path = os.path.join(root, file)
-                            new_playlist.append(extract_metadata(full_path))
-                
+                # Metadata is read on a thread pool; order matches the walk
+                new_playlist, stats = scan_folder(path, workers=scan_workers, extract=metadata_cache.extract)
+                metadata_cache.flush()
+                print(f"Scanned {stats} (cache: {metadata_cache.hits} hits, {metadata_cache.misses} misses)")
+
                 if new_playlist:
+                    new_playlist = PlaylistStore(new_playlist)
                     # Apply current sort
-                    if current_sort_key == "Title":
-                         new_playlist.sort(key=lambda x: natural_sort_key(x.get('title', '')))
-                    elif current_sort_key == "Track Number":
-                         new_playlist.sort(key=lambda x: (x.get('track', 0), natural_sort_key(x.get('title', ''))))
-                    else:
-                         new_playlist.sort(key=lambda x: natural_sort_key(x.get('filename', '')))
-                         
+                    new_playlist.sort(current_sort_key)
+
                     playlist = new_playlist
                     current_playlist_index = 0
                     load_track(playlist[0])
@@ -146,26 +109,19 @@ def main(page: ft.Page):
         
         current_sort_key = sort_key
         print(f"DEBUG: Request to sort by '{sort_key}' (Natural/Track)")
+        if scan_streaming:
+            return # Tiles are appended in scan order; the stream sorts once it is complete
         
-        # Store current playing path to restore index
-        current_path = playlist[current_playlist_index]['path'] if current_playlist_index >= 0 and current_playlist_index < len(playlist) else None
+        # Store current playing row to restore index
+        current_row = playlist.row_id(current_playlist_index) if current_playlist_index >= 0 and current_playlist_index < len(playlist) else None
         
-        if sort_key == "Title":
-            playlist.sort(key=lambda x: natural_sort_key(x.get('title', '')))
-        elif sort_key == "File Name":
-            playlist.sort(key=lambda x: natural_sort_key(x.get('filename', '')))
-        elif sort_key == "Track Number":
-             # Primary sort: Track Number, Secondary: Title
-            playlist.sort(key=lambda x: (x.get('track', 0), natural_sort_key(x.get('title', ''))))
-            
-        print(f"DEBUG: After Sort (First 3): {[t.get('title') for t in playlist[:3]]}")
+        playlist.sort(sort_key) # Switches to the kept permutation, no re-sort
+
+        print(f"DEBUG: After Sort (First 3): {[t.title for t in playlist[:3]]}")
 
         # Restore index
-        if current_path:
-            for i, track in enumerate(playlist):
-                if track['path'] == current_path:
-                    current_playlist_index = i
-                    break
+        if current_row is not None:
+            current_playlist_index = playlist.position(current_row)
         
         update_main_view()
 
@@ -310,54 +266,62 @@ def main(page: ft.Page):
         main_list_view.controls.append(header_container)
 
         # 2. QUEUE ITEMS
-        for i, track in enumerate(playlist):
-            is_active = (i == current_playlist_index)
-            # print(track)
-
-            async def play_clicked_track(e, index=i):
-                 nonlocal current_playlist_index
-                 current_playlist_index = index
-                 await load_track(playlist[current_playlist_index])
-
-            tile = ft.Container(
-                content=ft.Row([
-                    ft.Text(f"{i+1}", color=ft.Colors.GREY_500, width=30, size=12),
-                    
-                    # Title
-                    ft.Column([
-                        ft.Text(track.get('title', 'Unknown'), 
-                               color=ft.Colors.CYAN_400 if is_active else ft.Colors.WHITE, 
-                               weight="bold" if is_active else "normal",
-                               size=14, overflow=ft.TextOverflow.ELLIPSIS),
-                    ], expand=True),
-                    
-                    # Metadata (Time | Type)
-                    ft.Row([
-                       ft.Text(format_time(track.get('duration', 0)), color=ft.Colors.GREY_500, size=11, font_family="monospace"),
-                       ft.Container(
-                           content=ft.Text(track.get('ext', ''), size=9, weight="bold", color=ft.Colors.BLACK),
-                           bgcolor=ft.Colors.GREY_400,
-                           padding=ft.Padding(top=2, bottom=2, left=4, right=4),
-                           border_radius=4
-                       )
-                    ], spacing=10, alignment=ft.MainAxisAlignment.END)
-                    
-                ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
-                padding=ft.Padding(top=8, bottom=8, left=15, right=15),
-                border_radius=8,
-                bgcolor=ft.Colors.with_opacity(0.1, ft.Colors.WHITE) if is_active else None,
-                ink=True
-            )
-            tile.on_click = play_clicked_track
-            main_list_view.controls.append(tile)
+        main_list_view.controls.extend(queue_tile(i, track) for i, track in enumerate(playlist))
 
         # Update the list view
         page.update()
 
+    # One row of the queue
+    def queue_tile(i, track):
+        is_active = (i == current_playlist_index)
+        # print(track)
+
+        async def play_clicked_track(e, index=i):
+             nonlocal current_playlist_index
+             current_playlist_index = index
+             await load_track(playlist[current_playlist_index])
+
+        tile = ft.Container(
+            content=ft.Row([
+                ft.Text(f"{i+1}", color=ft.Colors.GREY_500, width=30, size=12),
+                
+                # Title
+                ft.Column([
+                    ft.Text(track.title, 
+                           color=ft.Colors.CYAN_400 if is_active else ft.Colors.WHITE, 
+                           weight="bold" if is_active else "normal",
+                           size=14, overflow=ft.TextOverflow.ELLIPSIS),
+                ], expand=True),
+                
+                # Metadata (Time | Type)
+                ft.Row([
+                   ft.Text(format_time(track.duration), color=ft.Colors.GREY_500, size=11, font_family="monospace"),
+                   ft.Container(
+                       content=ft.Text(track.ext, size=9, weight="bold", color=ft.Colors.BLACK),
+                       bgcolor=ft.Colors.GREY_400,
+                       padding=ft.Padding(top=2, bottom=2, left=4, right=4),
+                       border_radius=4
+                   )
+                ], spacing=10, alignment=ft.MainAxisAlignment.END)
+                
+            ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+            padding=ft.Padding(top=8, bottom=8, left=15, right=15),
+            border_radius=8,
+            bgcolor=ft.Colors.with_opacity(0.1, ft.Colors.WHITE) if is_active else None,
+            ink=True
+        )
+        tile.on_click = play_clicked_track
+        return tile
+
+    # Adds tiles for the tracks from ``start`` on, leaving the rest of the view alone
+    def append_queue_tiles(start):
+        main_list_view.controls.extend(queue_tile(i, playlist[i]) for i in range(start, len(playlist)))
+        page.update()
+
     async def load_track(track_data):
         nonlocal current_track, duration, is_playing
         current_track = track_data
-        file_path = track_data['path']
+        file_path = track_data.path
         
         # Reset UI Values
         current_time.value = "0:00"
@@ -371,18 +335,18 @@ def main(page: ft.Page):
         album_art_image_control.src_base64 = None
         
         # Metadata Display
-        track_title.value = track_data.get('title', 'Unknown')
-        artist_name.value = track_data.get('artist', 'Unknown Artist')
+        track_title.value = track_data.title
+        artist_name.value = track_data.artist
         
-        if track_data.get('duration'):
-            duration = track_data['duration']
+        if track_data.duration:
+            duration = track_data.duration
             total_duration.value = format_time(duration)
             progress_slider.max = duration
         
         # Art extraction (On demand to save memory in list)
         art_b64 = get_album_art_base64(file_path)
         if art_b64:
-            img_bg.src_base64 = art_b64
+            img_bg.src_base64 = get_album_art_base64(file_path, "background") or art_b64
             img_bg.src = ""
             album_art_image_control.src_base64 = art_b64
             album_art_image_control.src = ""
@@ -521,17 +485,18 @@ def main(page: ft.Page):
     
     # File Picker -----------------------------    
     async def handle_pick_files(e: ft.Event[ft.Button]):
-        nonlocal current_track, playlist, current_playlist_index
+        nonlocal current_track, playlist, current_playlist_index, library_root, library_state
         tracks = await ft.FilePicker().pick_files(
             allow_multiple=True, 
-            allowed_extensions=["mp3", "flac", "wav", "m4a", "alac"]
+            allowed_extensions=["mp3", "flac", "wav", "m4a", "alac", "aif", "aiff"]
         )
         if tracks and len(tracks) > 0:
             for track in tracks:
-                playlist.append(extract_metadata(Path(track.path).as_posix()))
+                playlist.append(metadata_cache.extract(Path(track.path).as_posix()))
             
             # print(playlist)
             current_playlist_index = 0
+            library_root, library_state = None, {} # Next folder pick is a full scan
             if playlist:
                 load_track(playlist[0])
             update_main_view()
@@ -540,36 +505,96 @@ def main(page: ft.Page):
     btn_lib_file.on_click = handle_pick_files
     
     # Folder Picker --------------------------
+    async def stream_folder_into_queue(path):
+        nonlocal playlist, current_playlist_index, library_root, library_state, scan_generation, scan_streaming
+        scan_generation += 1
+        generation = scan_generation
+        playlist = PlaylistStore()
+        current_playlist_index = -1
+        library_root, library_state = None, {} # Set once the scan is complete
+        state = {} # Filled by the walk: no second stat pass afterwards
+        scan_streaming = True
+        try:
+            await stream_playlist(path, generation, state)
+        finally:
+            if generation == scan_generation:
+                scan_streaming = False
+        if generation == scan_generation and playlist:
+            # Apply current sort once everything is in, keeping the playing track selected
+            current_row = playlist.row_id(current_playlist_index) if 0 <= current_playlist_index < len(playlist) else None
+            playlist.sort(current_sort_key)
+            if current_row is not None:
+                current_playlist_index = playlist.position(current_row)
+            library_root, library_state = os.path.abspath(path), state
+            update_main_view()
+
+    async def stream_playlist(path, generation, state):
+        nonlocal current_playlist_index
+        start = time.perf_counter()
+        async for batch in stream_folder(path, workers=scan_workers, extract=metadata_cache.extract, state=state):
+            if generation != scan_generation:
+                return # A newer pick took over; leaving the loop stops this scan
+            added_from = len(playlist)
+            playlist.extend(batch)
+            if current_playlist_index < 0:
+                # First hit: start playing right away, the rest keeps loading
+                current_playlist_index = 0
+                print(f"First track ready after {(time.perf_counter() - start) * 1000:.0f} ms")
+                await load_track(playlist[0])
+            else:
+                append_queue_tiles(added_from) # Not the whole view: that would be O(n^2) over the scan
+        metadata_cache.flush()
+        if generation != scan_generation:
+            return
+
+        if not playlist:
+            print("No audio files found in folder.")
+            update_main_view()
+            return
+        print(f"Loaded {len(playlist)} tracks in {time.perf_counter() - start:.2f}s.")
+
     async def handle_pick_folder(e: ft.Event[ft.Button]):
-        nonlocal playlist, current_playlist_index
+        nonlocal playlist, current_playlist_index, library_root, library_state
         path = await ft.FilePicker(
         ).get_directory_path()
         if path:
-            supported_ext = ('.mp3', '.flac', '.wav', '.m4a', '.alac')
-            new_playlist = []
             try:
-                # Show loading? (Blocking for now, simpler)
-                for root, dirs, files in os.walk(path):
-                    for file in files:
-                        if file.lower().endswith(supported_ext):
-                            full_path = os.path.join(root, file)
-                            new_playlist.append(extract_metadata(full_path))
-                
-                if new_playlist:
+                # Re-picking the loaded folder only re-reads new/changed files.
+                # Scan on a worker thread so the event loop keeps serving the UI
+                incremental = bool(playlist) and library_root == os.path.abspath(path)
+                if stream_scan and not incremental:
+                    await stream_folder_into_queue(path)
+                    return
+
+                diff = await asyncio.to_thread(rescan_folder, path, library_state if incremental else {},
+                                               scan_workers, metadata_cache.extract)
+                metadata_cache.flush()
+                print(f"Scanned {diff.stats} (cache: {metadata_cache.hits} hits, {metadata_cache.misses} misses)")
+
+                if incremental:
+                    if diff:
+                        current_path = playlist[current_playlist_index].path if 0 <= current_playlist_index < len(playlist) else None
+                        playlist.apply_rescan(diff)
+                        playlist.sort(current_sort_key)
+                        if current_path in playlist:
+                            current_playlist_index = playlist.index_of(current_path)
+                        else:
+                            current_playlist_index = min(current_playlist_index, len(playlist) - 1)
+                    print(f"Rescanned library ({diff}), {len(playlist)} tracks.")
+                elif diff.added:
+                    new_playlist = PlaylistStore(diff.added)
                     # Apply current sort
-                    if current_sort_key == "Title":
-                         new_playlist.sort(key=lambda x: natural_sort_key(x.get('title', '')))
-                    elif current_sort_key == "Track Number":
-                         new_playlist.sort(key=lambda x: (x.get('track', 0), natural_sort_key(x.get('title', ''))))
-                    else:
-                         new_playlist.sort(key=lambda x: natural_sort_key(x.get('filename', '')))
-                         
+                    new_playlist.sort(current_sort_key)
+
                     playlist = new_playlist
                     current_playlist_index = 0
                     await load_track(playlist[0])
                     print(f"Loaded {len(playlist)} tracks.")
                 else:
                     print("No audio files found in folder.")
+                # Only now: if building the queue failed, the next pick must not count as a rescan of it
+                library_root = os.path.abspath(path)
+                library_state = diff.state
             except Exception as err:
                 print(f"Error scanning folder: {err}")
             
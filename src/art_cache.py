@@ -0,0 +1,124 @@
+from collections import OrderedDict
+import os
+import threading
+
+# Byte budget of the in-memory album art cache, by Flet page platform. Phones
+# get far less than desktops: an Android app is killed well before a desktop
+# process would notice a few dozen MB.
+ART_CACHE_BYTES = {
+    "android": 8 * 1024 * 1024,
+    "ios": 16 * 1024 * 1024,
+    "default": 48 * 1024 * 1024,
+}
+ART_CACHE_ENV = "HIRES_ART_CACHE_MB" # Overrides the platform budget when set
+ENTRY_OVERHEAD = 256 # bytes charged per entry for the key, bookkeeping and "no art" results
+
+
+def art_cache_budget(platform=None):
+    """Budget in bytes for ``platform`` (a ft.PagePlatform or its name), env override first."""
+    env = os.environ.get(ART_CACHE_ENV)
+    if env:
+        try:
+            return int(float(env) * 1024 * 1024)
+        except ValueError:
+            print(f"Ignoring {ART_CACHE_ENV}={env!r}: not a number")
+    name = str(getattr(platform, "value", platform) or "").lower()
+    return ART_CACHE_BYTES.get(name, ART_CACHE_BYTES["default"])
+
+
+class ArtCache:
+    """LRU cache of album art per file, bounded by the total size of its values.
+
+    Entries are keyed by path and remember the file's mtime; a file modified
+    since (retagged, new cover) misses and is reloaded. Tracks without art are
+    cached too, as None, so they are not re-read on every play. Values are
+    whatever the loader returns (a base64 string or bytes); their ``len`` plus
+    ENTRY_OVERHEAD counts against ``max_bytes``. A value bigger than the whole
+    budget is returned but not kept. Safe to use from several threads.
+    """
+
+    def __init__(self, max_bytes=ART_CACHE_BYTES["default"]):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict() # path -> (mtime_ns, value, size), least recently used first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, path):
+        return path in self._entries
+
+    def get(self, path, loader):
+        """Art of ``path``, from the cache or ``loader(path)`` on a miss."""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == mtime:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        # Load outside the lock: reading tags is slow and other lookups shouldn't wait
+        value = loader(path)
+        if mtime is not None:
+            self.put(path, mtime, value)
+        return value
+
+    def put(self, path, mtime, value):
+        size = (len(value) if value else 0) + ENTRY_OVERHEAD
+        with self._lock:
+            self._discard(path)
+            if size > self.max_bytes:
+                return
+            self._entries[path] = (mtime, value, size)
+            self.bytes += size
+            self._evict()
+
+    def discard(self, path):
+        with self._lock:
+            self._discard(path)
+
+    def _discard(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and self._entries:
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+
+    def set_max_bytes(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def summary_text(self):
+        s = self.stats()
+        return (f"art cache        {s['entries']} entries  {s['bytes'] / 1048576:.1f}/{s['max_bytes'] / 1048576:.0f} MB  "
+                f"hits {s['hits']}  misses {s['misses']}  ({s['hit_rate']:.0%})  evicted {s['evictions']}")
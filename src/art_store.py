@@ -0,0 +1,352 @@
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+
+from tinytag import TinyTag
+
+from storage import app_data_path
+
+try:
+    from PIL import Image, ImageFilter
+except ImportError: # Without Pillow the original image is stored and served for every size
+    Image = None
+
+# Sized variants rendered from each embedded cover: (longest side in px, blur radius)
+VARIANTS = {
+    "foreground": (250, 0), # album_art_image_control
+    "background": (64, 4),  # img_bg: stretched full screen, so tiny and pre-blurred
+    "thumb": (40, 0),       # queue tiles
+}
+JPEG_QUALITY = 85
+
+# Album images looked for next to files without embedded art (case-insensitive), best first
+FOLDER_IMAGES = ("cover.jpg", "folder.jpg", "front.jpg", "cover.jpeg", "folder.jpeg",
+                 "cover.png", "folder.png", "front.png", "albumart.jpg")
+
+# Pending index rows are written in one transaction once this many have piled up
+FLUSH_EVERY = 500
+
+# Bump when the index tables change; see ArtStore._migrate
+SCHEMA_VERSION = 2 # 2: per-image and per-folder tables, folder image fallback
+
+
+def default_art_dir():
+    return app_data_path("art_cache")
+
+
+def web_index_path():
+    # Index of the store web mode keeps in the served assets dir. Its own file:
+    # an index only describes the images in its own art_dir.
+    return app_data_path("art_cache_web.sqlite3")
+
+
+def read_embedded_art(file_path):
+    """Raw bytes of the file's embedded cover, or None."""
+    try:
+        tag = TinyTag.get(file_path, image=True)
+        images = getattr(tag, "images", None)
+        if images is not None and hasattr(images, "any"): # tinytag 2
+            image = images.any
+            return image.data if image is not None else None
+        return tag.get_image()
+    except Exception:
+        return None
+
+
+def find_folder_image(directory):
+    try:
+        names = {name.lower(): name for name in os.listdir(directory)}
+    except OSError:
+        return None
+    for name in FOLDER_IMAGES:
+        if name in names:
+            return os.path.join(directory, names[name])
+    return None
+
+
+def art_digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def render_variants(data):
+    """{variant: JPEG bytes} for ``data``; empty if Pillow is missing or can't decode it."""
+    if Image is None:
+        return {}
+    try:
+        img = Image.open(io.BytesIO(data))
+        # JPEG decodes straight at a reduced scale (1/2 .. 1/8) close to the largest variant
+        largest = max(size for size, _ in VARIANTS.values())
+        img.draft("RGB", (largest, largest))
+        img = img.convert("RGB")
+    except Exception as e:
+        print(f"Cannot decode album art: {e}")
+        return {}
+    out = {}
+    for name, (size, blur) in sorted(VARIANTS.items(), key=lambda v: -v[1][0]):
+        img.thumbnail((size, size), Image.LANCZOS) # Each variant from the previous, larger one
+        variant = img.filter(ImageFilter.GaussianBlur(blur)) if blur else img
+        buf = io.BytesIO()
+        variant.save(buf, "JPEG", quality=JPEG_QUALITY, optimize=True)
+        out[name] = buf.getvalue()
+    return out
+
+
+class ArtStore:
+    """Disk cache of album art, downscaled once into the sizes the UI shows.
+
+    Art is content-addressed. A cover is hashed and its rendered variants are
+    written under that hash (``<dir>/ab/abcd..._foreground.jpg``), once, however
+    many tracks embed it. The SQLite index next to them has three tables:
+
+    - ``art``: one row per distinct image (hash, where it was first seen, size)
+    - ``art_files``: audio file (path, size, mtime) -> hash, "" if it has no art
+    - ``album_art``: folder -> hash of its cover.jpg/folder.jpg/..., used for
+      files without embedded art
+
+    So storage grows with the number of albums, and a track only carries a
+    pointer. The first request for a file parses its tags; later ones, in this
+    run or the next, are a stat and a dict lookup. Index rows are written in
+    batches (FLUSH_EVERY, ``flush``, ``close``); lookups read the in-memory
+    copy, so unwritten rows are still found.
+
+    The index sits in ``art_dir`` unless ``index_path`` says otherwise. It
+    holds the full path of every scanned file and folder, so when ``art_dir``
+    is served (web mode) it must go elsewhere.
+
+    Without Pillow the original image is written once (``_original``) and
+    returned for the foreground and background; there are no thumbnails.
+    """
+
+    def __init__(self, art_dir=None, read_art=read_embedded_art, index_path=None):
+        self.art_dir = art_dir or default_art_dir()
+        self.index_path = index_path or os.path.join(self.art_dir, "index.sqlite3")
+        self._read_art = read_art
+        self._lock = threading.Lock()
+        self._files = None  # path -> (size, mtime_ns, digest or ""), loaded on first use
+        self._images = None # digest -> source path of the image
+        self._albums = None # folder -> (folder mtime_ns, image path or "", image mtime_ns, digest or "")
+        self._pending = []  # (sql, row) in the dicts above but not in the database yet
+        os.makedirs(self.art_dir, exist_ok=True)
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+        self._remove_stray_index()
+        self._conn = sqlite3.connect(self.index_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+
+    def _remove_stray_index(self):
+        # An index left in art_dir by a run that kept it there (before index_path)
+        own = os.path.join(self.art_dir, "index.sqlite3")
+        if os.path.abspath(self.index_path) == os.path.abspath(own):
+            return
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(own + suffix)
+            except OSError:
+                pass
+
+    def _migrate(self):
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS art (
+                digest TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                bytes INTEGER NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS art_files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                digest TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS album_art (
+                folder TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                image TEXT NOT NULL,
+                image_mtime_ns INTEGER NOT NULL,
+                digest TEXT NOT NULL
+            )
+        """)
+        if version < 2:
+            # Files indexed without art before the folder image fallback: look again.
+            # Their variant files are all still valid (same hashes).
+            self._conn.execute("DELETE FROM art_files WHERE digest = ''")
+        self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.commit()
+
+    def _load(self):
+        # Called with the lock held
+        if self._files is None:
+            self._images = dict(self._conn.execute("SELECT digest, source FROM art").fetchall())
+            intern = {d: d for d in self._images} # One string per image, shared by all its tracks
+            intern[""] = ""
+            self._files = {path: (size, mtime, intern.get(digest, digest)) for path, size, mtime, digest
+                           in self._conn.execute("SELECT path, size, mtime_ns, digest FROM art_files")}
+            self._albums = {folder: (mtime, image, image_mtime, intern.get(digest, digest))
+                            for folder, mtime, image, image_mtime, digest
+                            in self._conn.execute("SELECT * FROM album_art")}
+        return self._files
+
+    def _queue(self, sql, row):
+        # Called with the lock held
+        self._pending.append((sql, row))
+        if len(self._pending) >= FLUSH_EVERY:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        for sql, row in self._pending:
+            self._conn.execute(sql, row)
+        self._conn.commit()
+        self._pending.clear()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _file(self, digest, variant):
+        return os.path.join(self.art_dir, digest[:2], f"{digest}_{variant}.jpg")
+
+    def _existing(self, digest, variant):
+        path = self._file(digest, variant)
+        if os.path.exists(path):
+            return path
+        if variant != "thumb": # Pillow missing, or it couldn't decode this image
+            path = self._file(digest, "original")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _write(self, digest, data):
+        os.makedirs(os.path.join(self.art_dir, digest[:2]), exist_ok=True)
+        files = render_variants(data) or {"original": data}
+        for variant, blob in files.items():
+            path = self._file(digest, variant)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, path) # Readers never see a half-written file
+
+    def _add_image(self, data, source):
+        # Hash of ``data``, rendering its variants if this image is new
+        digest = art_digest(data)
+        with self._lock:
+            self._load()
+            known = self._images.get(digest) is not None
+        if not known or self._existing(digest, "foreground") is None:
+            self._write(digest, data)
+        if not known:
+            with self._lock:
+                self._images[digest] = source
+                self._queue("INSERT OR IGNORE INTO art VALUES (?, ?, ?)", (digest, source, len(data)))
+        return digest
+
+    def folder_digest(self, folder):
+        """Hash of the folder's cover image ("" if none), reading it only when it changed."""
+        try:
+            mtime = os.stat(folder).st_mtime_ns
+        except OSError:
+            return ""
+        with self._lock:
+            self._load()
+            entry = self._albums.get(folder)
+        if entry is not None and entry[0] == mtime:
+            # Adding/removing/renaming the image bumps the folder mtime; rewriting it doesn't
+            image, image_mtime, digest = entry[1:]
+            try:
+                if not image or os.stat(image).st_mtime_ns == image_mtime:
+                    return digest
+            except OSError:
+                pass
+
+        image, image_mtime, digest = find_folder_image(folder), 0, ""
+        if image:
+            try:
+                with open(image, "rb") as f:
+                    data = f.read()
+                    image_mtime = os.fstat(f.fileno()).st_mtime_ns
+                if data:
+                    digest = self._add_image(data, image)
+            except OSError:
+                image = None
+        with self._lock:
+            self._albums[folder] = (mtime, image or "", image_mtime, digest)
+            self._queue("INSERT OR REPLACE INTO album_art VALUES (?, ?, ?, ?, ?)",
+                        (folder, mtime, image or "", image_mtime, digest))
+        return digest
+
+    def digest(self, file_path):
+        """Hash of the file's art ("" if it has none), extracting it if not indexed yet.
+
+        Embedded art first, else the folder image.
+        """
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return ""
+        with self._lock:
+            entry = self._load().get(file_path)
+        if entry is not None and entry[:2] == (st.st_size, st.st_mtime_ns):
+            return entry[2]
+
+        data = self._read_art(file_path)
+        digest = self._add_image(data, file_path) if data else self.folder_digest(os.path.dirname(file_path))
+        with self._lock:
+            self._files[file_path] = (st.st_size, st.st_mtime_ns, digest)
+            self._queue("INSERT OR REPLACE INTO art_files VALUES (?, ?, ?, ?)",
+                        (file_path, st.st_size, st.st_mtime_ns, digest))
+        return digest
+
+    def variant_path(self, file_path, variant):
+        """Image file of ``variant`` for ``file_path``'s art, rendering it if needed; None without art."""
+        digest = self.digest(file_path)
+        if not digest:
+            return None
+        path = self._existing(digest, variant)
+        if path is None and self._existing(digest, "foreground") is None:
+            self._restore(file_path, digest)
+            path = self._existing(digest, variant)
+        return path
+
+    def _restore(self, file_path, digest):
+        # Indexed image whose files are gone from art_dir (cache cleared by hand,
+        # or an index shared with another art_dir): render it again from its source
+        data = self._read_art(file_path)
+        if not data:
+            image = find_folder_image(os.path.dirname(file_path))
+            try:
+                with open(image, "rb") as f:
+                    data = f.read()
+            except (OSError, TypeError):
+                return
+        if data and art_digest(data) == digest:
+            self._write(digest, data)
+
+    def cached_variant_path(self, file_path, variant):
+        # Like variant_path, but never opens the audio file: None unless already
+        # indexed. For the queue, where binding a tile must stay cheap.
+        with self._lock:
+            entry = self._load().get(file_path)
+        return self._existing(entry[2], variant) if entry and entry[2] else None
+
+    def stats(self):
+        with self._lock:
+            files = self._load()
+            return {"files": len(files), "files_with_art": sum(1 for e in files.values() if e[2]),
+                    "images": len(self._images), "folders": len(self._albums)}
+
+    def summary_text(self):
+        s = self.stats()
+        return f"art store        {s['files_with_art']}/{s['files']} files with art -> {s['images']} images"
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
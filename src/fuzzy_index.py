@@ -0,0 +1,126 @@
+from search_index import tokenize
+
+# Typo-tolerant lookup of title/artist strings by shared trigrams. The index
+# lives in the metadata cache database next to the tracks table, so it grows
+# as files are scanned and is there on the next start without a rebuild.
+# Strings are folded first (see metadata.fold_text): "Beyoncé", "Beyonce"
+# and "BEYONCE" produce the same trigrams.
+
+MIN_SCORE = 0.5 # Share of the query's trigrams a string must contain
+
+TABLES = (
+    """
+    CREATE TABLE IF NOT EXISTS fuzzy_strings (
+        id INTEGER PRIMARY KEY,
+        text TEXT UNIQUE NOT NULL,
+        grams INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS fuzzy_grams (
+        gram TEXT NOT NULL,
+        string_id INTEGER NOT NULL,
+        PRIMARY KEY (gram, string_id)
+    ) WITHOUT ROWID
+    """,
+)
+
+
+def trigrams(text):
+    # Per word, padded so short words and word starts still get grams:
+    # "Halo" -> "  h", " ha", "hal", "alo", "lo "
+    grams = set()
+    for word in tokenize(text):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def create_tables(conn):
+    for sql in TABLES:
+        conn.execute(sql)
+
+
+def drop_tables(conn):
+    conn.execute("DROP TABLE IF EXISTS fuzzy_grams")
+    conn.execute("DROP TABLE IF EXISTS fuzzy_strings")
+
+
+CHUNK = 500 # Strings per IN (...) lookup, under SQLite's variable limit
+
+
+def _chunks(items):
+    items = list(items)
+    for i in range(0, len(items), CHUNK):
+        yield items[i:i + CHUNK]
+
+
+def unindexed_strings(conn):
+    """Titles/artists in the tracks table missing from the index (e.g. after a crash)."""
+    return {s for (s,) in conn.execute(
+        "SELECT title FROM tracks UNION SELECT artist FROM tracks EXCEPT SELECT text FROM fuzzy_strings") if s}
+
+
+def new_strings(conn, strings):
+    """Those of ``strings`` not indexed yet."""
+    new = set(strings) - {None, ""}
+    for chunk in _chunks(new.copy()):
+        placeholders = ",".join("?" * len(chunk))
+        new.difference_update(s for (s,) in conn.execute(
+            f"SELECT text FROM fuzzy_strings WHERE text IN ({placeholders})", chunk))
+    return new
+
+
+def add_strings(conn, grams_of):
+    """Index ``grams_of`` ({text: trigrams(text)}, none indexed yet). The caller commits."""
+    conn.executemany("INSERT OR IGNORE INTO fuzzy_strings (text, grams) VALUES (?, ?)",
+                     [(text, len(grams)) for text, grams in grams_of.items()])
+    rows = []
+    for chunk in _chunks(grams_of):
+        placeholders = ",".join("?" * len(chunk))
+        for string_id, text in conn.execute(
+                f"SELECT id, text FROM fuzzy_strings WHERE text IN ({placeholders})", chunk):
+            rows.extend((g, string_id) for g in grams_of[text])
+    conn.executemany("INSERT OR IGNORE INTO fuzzy_grams (gram, string_id) VALUES (?, ?)", rows)
+
+
+def index_strings(conn, strings):
+    """Add any of ``strings`` not indexed yet. The caller commits."""
+    add_strings(conn, {text: trigrams(text) for text in new_strings(conn, strings)})
+
+
+def prune_strings(conn, strings):
+    """Drop those of ``strings`` no row of the tracks table uses any more. The caller commits."""
+    gone = set(strings) - {None, ""}
+    if not gone:
+        return
+    # One pass over the tracks table (title/artist aren't indexed), not one per string
+    gone.difference_update(s for (s,) in conn.execute("SELECT title FROM tracks UNION SELECT artist FROM tracks"))
+    ids = [row[0] for text in gone for row in conn.execute("SELECT id FROM fuzzy_strings WHERE text = ?", (text,))]
+    conn.executemany("DELETE FROM fuzzy_grams WHERE string_id = ?", [(i,) for i in ids])
+    conn.executemany("DELETE FROM fuzzy_strings WHERE id = ?", [(i,) for i in ids])
+
+
+def search_strings(conn, query, min_score=MIN_SCORE, limit=1000):
+    """Indexed strings resembling ``query``, best first, as ``(text, score)``.
+
+    ``limit=None`` returns every match.
+
+    ``score`` is the share of the query's trigrams found in the string; ties
+    are broken by the Dice coefficient, which favours strings of similar length.
+    """
+    grams = trigrams(query)
+    if not grams:
+        return []
+    need = max(1, int(len(grams) * min_score + 0.999))
+    placeholders = ",".join("?" * len(grams))
+    rows = conn.execute(
+        f"SELECT s.text, s.grams, m.shared FROM ("
+        f"  SELECT string_id, COUNT(*) AS shared FROM fuzzy_grams"
+        f"  WHERE gram IN ({placeholders}) GROUP BY string_id HAVING shared >= ?"
+        f") m JOIN fuzzy_strings s ON s.id = m.string_id",
+        (*grams, need)
+    ).fetchall()
+    scored = [(shared / len(grams), 2 * shared / (len(grams) + n), text) for text, n, shared in rows]
+    scored.sort(reverse=True)
+    return [(text, score) for score, _, text in scored[:limit]]
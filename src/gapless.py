@@ -0,0 +1,221 @@
+import os
+import struct
+from collections import namedtuple
+
+# Encoder delay and padding: lossy encoders add silence before the first and
+# after the last real sample (MP3 frames hold 1152 samples, AAC frames 1024,
+# and the codec needs priming). Encoders record how much, so a player can cut
+# it and consecutive tracks join without a gap:
+#   MP3: LAME tag in the Xing/Info frame (encoder delay, padding, frame count)
+#   MP3/M4A from iTunes: iTunSMPB comment " 00000000 <delay> <padding> <samples> ..."
+# WAV/FLAC/AIFF have neither, so their info is all zeros.
+
+MP3_DECODER_DELAY = 529 # Samples a standard MP3 decoder adds on top of the LAME delay
+MAX_ATOMS = 256 # Atoms visited per MP4 container level before giving up
+MAX_ID3_FRAMES = 256 # ID3 frames visited looking for iTunSMPB
+MAX_COMM_FRAME = 4096 # Larger COMM frames are skipped unread
+
+GaplessInfo = namedtuple("GaplessInfo", ["delay", "padding", "samples", "samplerate"])
+GaplessInfo.__doc__ = """Encoder delay and padding in samples, and the real sample count (0: unknown)."""
+
+MP3_SAMPLERATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def _syncsafe(b):
+    return (b[0] & 0x7F) << 21 | (b[1] & 0x7F) << 14 | (b[2] & 0x7F) << 7 | (b[3] & 0x7F)
+
+
+def _parse_smpb(text, samplerate):
+    # " 00000000 00000840 000001CA 00000000003F31F6 ..." (hex)
+    fields = text.split()
+    if len(fields) < 4 or not samplerate:
+        return None
+    try:
+        delay, padding, samples = (int(x, 16) for x in fields[1:4])
+    except ValueError:
+        return None
+    return GaplessInfo(delay, padding, samples, samplerate)
+
+
+def _id3_smpb(f, end, version):
+    # iTunSMPB from an ID3v2.3/2.4 COMM frame. Walks the frame headers from the
+    # file position up to ``end`` and only reads COMM bodies: the tag can hold
+    # megabytes of cover art (APIC) that are seeked over.
+    pos = f.tell()
+    for _ in range(MAX_ID3_FRAMES):
+        if pos + 10 > end:
+            break
+        f.seek(pos)
+        header = f.read(10)
+        fid, size = header[:4], header[4:8]
+        if len(header) < 10 or not fid.strip(b"\x00"):
+            break # Padding
+        size = _syncsafe(size) if version == 4 else struct.unpack(">I", size)[0]
+        if fid == b"COMM" and 4 < size <= MAX_COMM_FRAME:
+            body = f.read(size)
+            encoding = body[0]
+            sep = b"\x00\x00" if encoding in (1, 2) else b"\x00"
+            desc, _, text = body[4:].partition(sep)
+            codec = {0: "latin-1", 1: "utf-16", 2: "utf-16-be"}.get(encoding, "utf-8")
+            if desc.decode(codec, "ignore").strip("\x00") == "iTunSMPB":
+                return text.decode(codec, "ignore").strip("\x00")
+        pos += 10 + size
+    return None
+
+
+def _mp3_info(f):
+    head = f.read(10)
+    start, smpb = 0, None
+    if head[:3] == b"ID3":
+        start = 10 + _syncsafe(head[6:10])
+        if head[3] in (3, 4):
+            smpb = _id3_smpb(f, start, head[3])
+    f.seek(start)
+    frame = f.read(4 + 32 + 120 + 36) # Header, longest side info, Xing fields, LAME tag
+    # Skip padding between the ID3 tag and the first frame
+    i = 0
+    while i + 1 < len(frame) and not (frame[i] == 0xFF and frame[i + 1] & 0xE0 == 0xE0):
+        i += 1
+    if i:
+        f.seek(start + i)
+        frame = f.read(4 + 32 + 120 + 36)
+    if len(frame) < 4 or frame[0] != 0xFF or frame[1] & 0xE0 != 0xE0:
+        return None
+    version = (frame[1] >> 3) & 0x03 # 3: MPEG1, 2: MPEG2, 0: MPEG2.5
+    rate_index = (frame[2] >> 2) & 0x03
+    if version not in MP3_SAMPLERATES or rate_index == 3:
+        return None
+    samplerate = MP3_SAMPLERATES[version][rate_index]
+    if smpb:
+        info = _parse_smpb(smpb, samplerate)
+        if info:
+            return info
+
+    mono = (frame[3] >> 6) == 3
+    side_info = (17 if mono else 32) if version == 3 else (9 if mono else 17)
+    xing = 4 + side_info
+    if frame[xing:xing + 4] not in (b"Xing", b"Info"):
+        return None
+    flags = struct.unpack(">I", frame[xing + 4:xing + 8])[0]
+    pos = xing + 8
+    frames = 0
+    if flags & 0x1:
+        frames = struct.unpack(">I", frame[pos:pos + 4])[0]
+        pos += 4
+    pos += (4 if flags & 0x2 else 0) + (100 if flags & 0x4 else 0) + (4 if flags & 0x8 else 0)
+    lame = frame[pos:pos + 24]
+    if len(lame) < 24 or lame[:4] not in (b"LAME", b"Lavf", b"Lavc"):
+        return None
+    delay = (lame[21] << 4) | (lame[22] >> 4)
+    padding = ((lame[22] & 0x0F) << 8) | lame[23]
+    delay += MP3_DECODER_DELAY
+    padding = max(0, padding - MP3_DECODER_DELAY)
+    per_frame = 1152 if version == 3 else 576
+    samples = max(0, frames * per_frame - delay - padding) if frames else 0
+    return GaplessInfo(delay, padding, samples, samplerate)
+
+
+def _atoms(f, start, end):
+    # (type, body start, body end) of the MP4 atoms between start and end
+    pos = start
+    for _ in range(MAX_ATOMS):
+        if pos + 8 > end:
+            return
+        f.seek(pos)
+        hdr = f.read(8)
+        if len(hdr) < 8:
+            return
+        size, kind = struct.unpack(">I4s", hdr)
+        body = pos + 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            body += 8
+        elif size == 0:
+            size = end - pos
+        if size < body - pos:
+            return
+        yield kind, body, pos + size
+        pos += size
+
+
+def _child(f, start, end, *path):
+    for kind, body, stop in _atoms(f, start, end):
+        if kind == path[0]:
+            if len(path) == 1:
+                return body, stop
+            if kind == b"meta":
+                body += 4 # version/flags
+            return _child(f, body, stop, *path[1:])
+    return None
+
+
+def _mp4_info(f, file_size):
+    moov = _child(f, 0, file_size, b"moov")
+    if moov is None:
+        return None
+    samplerate = 0
+    for kind, body, stop in _atoms(f, *moov):
+        if kind != b"trak":
+            continue
+        mdhd = _child(f, body, stop, b"mdia", b"mdhd")
+        hdlr = _child(f, body, stop, b"mdia", b"hdlr")
+        if mdhd is None or hdlr is None:
+            continue
+        f.seek(hdlr[0] + 8)
+        if f.read(4) != b"soun":
+            continue
+        f.seek(mdhd[0])
+        version = f.read(1)[0]
+        f.seek(mdhd[0] + (20 if version == 1 else 12))
+        samplerate = struct.unpack(">I", f.read(4))[0]
+        break
+
+    ilst = _child(f, *moov, b"udta", b"meta", b"ilst")
+    if ilst is None:
+        return None
+    for kind, body, stop in _atoms(f, *ilst):
+        if kind != b"----":
+            continue
+        name = _child(f, body, stop, b"name")
+        data = _child(f, body, stop, b"data")
+        if name is None or data is None:
+            continue
+        f.seek(name[0] + 4)
+        if f.read(name[1] - name[0] - 4) != b"iTunSMPB":
+            continue
+        f.seek(data[0] + 8) # type + locale
+        return _parse_smpb(f.read(data[1] - data[0] - 8).decode("latin-1"), samplerate)
+    return None
+
+
+def read_gapless_info(file_path):
+    """GaplessInfo of an MP3/M4A file, or None when it records no delay/padding."""
+    ext = os.path.splitext(file_path)[1].lower()
+    try:
+        with open(file_path, "rb") as f:
+            if ext == ".mp3":
+                return _mp3_info(f)
+            if ext in (".m4a", ".alac", ".mp4", ".aac"):
+                return _mp4_info(f, os.fstat(f.fileno()).st_size)
+    except (OSError, ValueError, IndexError, struct.error):
+        pass
+    return None
+
+
+def trim_ms(info, player_duration_ms):
+    """(lead-in, end) in ms of the real audio inside what the player reports.
+
+    Players differ: ExoPlayer and AVPlayer already drop the delay/padding,
+    others play it. If the player's duration is about the real sample count,
+    there is nothing to trim; if it's about the padded length, the audio
+    starts at the delay and ends before the padding.
+    """
+    if not info or not info.samplerate or not player_duration_ms:
+        return 0, player_duration_ms
+    delay_ms = info.delay * 1000 / info.samplerate
+    padding_ms = info.padding * 1000 / info.samplerate
+    if info.samples:
+        content_ms = info.samples * 1000 / info.samplerate
+        if player_duration_ms < content_ms + (delay_ms + padding_ms) / 2:
+            return 0, player_duration_ms # Already trimmed by the player
+    return delay_ms, max(delay_ms, player_duration_ms - padding_ms)
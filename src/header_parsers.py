@@ -0,0 +1,251 @@
+import os
+import struct
+
+# Fast path for the lossless containers that make up most of the library.
+# Duration, sample rate, bit depth and channel count live in a fixed-size
+# header (WAV fmt/data, FLAC STREAMINFO, AIFF COMM), so they are read with a
+# handful of small reads and seeks instead of TinyTag's general parser. Simple
+# text tags (WAV LIST/INFO, FLAC Vorbis comments, AIFF NAME/AUTH) are decoded
+# too; anything else (embedded ID3, oversized comment blocks) is flagged with
+# needs_tags so the caller can fall back to TinyTag for the tags only.
+
+MAX_CHUNKS = 64              # Give up on files with absurd chunk counts
+MAX_TEXT_BLOCK = 64 * 1024   # Largest tag chunk / comment block read inline
+
+WAV_INFO_TAGS = {b"INAM": "title", b"IART": "artist", b"ITRK": "track", b"IPRT": "track", b"TRCK": "track"}
+VORBIS_TAGS = {"TITLE": "title", "ARTIST": "artist", "TRACKNUMBER": "track"}
+AIFF_TEXT_TAGS = {b"NAME": "title", b"AUTH": "artist"}
+
+
+def _text(raw):
+    raw = raw.split(b"\x00", 1)[0].strip()
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("latin-1")
+
+
+def _new_info():
+    return {
+        "duration": 0,     # milliseconds
+        "samplerate": 0,
+        "bitdepth": 0,
+        "channels": 0,
+        "title": None,
+        "artist": None,
+        "track": None,
+        "needs_tags": False,
+    }
+
+
+# --- WAV / RF64 ---
+
+def _parse_wav(f, file_size):
+    head = f.read(12)
+    if len(head) < 12 or head[:4] not in (b"RIFF", b"RF64") or head[8:12] != b"WAVE":
+        return None
+    info = _new_info()
+    byte_rate = 0
+    data_size = None
+    ds64_data_size = None
+    pos = 12
+
+    for _ in range(MAX_CHUNKS):
+        f.seek(pos)
+        hdr = f.read(8)
+        if len(hdr) < 8:
+            break
+        cid, size = hdr[:4], struct.unpack("<I", hdr[4:])[0]
+        body = pos + 8
+
+        if cid == b"ds64":
+            # RF64: real 64-bit sizes live here, the 32-bit fields are 0xFFFFFFFF
+            ds64 = f.read(24)
+            if len(ds64) == 24:
+                ds64_data_size = struct.unpack("<Q", ds64[8:16])[0]
+        elif cid == b"fmt ":
+            fmt = f.read(16)
+            if len(fmt) < 16:
+                return None
+            _, channels, rate, byte_rate, _, bits = struct.unpack("<HHIIHH", fmt)
+            info["channels"], info["samplerate"], info["bitdepth"] = channels, rate, bits
+        elif cid == b"data":
+            if size == 0xFFFFFFFF and ds64_data_size is not None:
+                size = ds64_data_size
+            # Streams written without a final size report 0 or run past EOF
+            if size == 0 or body + size > file_size:
+                size = file_size - body
+            data_size = size
+        elif cid == b"LIST" and size <= MAX_TEXT_BLOCK:
+            block = f.read(size)
+            if block[:4] == b"INFO":
+                i = 4
+                while i + 8 <= len(block):
+                    sid, ssize = block[i:i + 4], struct.unpack("<I", block[i + 4:i + 8])[0]
+                    key = WAV_INFO_TAGS.get(sid)
+                    if key and not info[key]:
+                        info[key] = _text(block[i + 8:i + 8 + ssize])
+                    i += 8 + ssize + (ssize & 1)
+        elif cid in (b"id3 ", b"ID3 "):
+            info["needs_tags"] = True
+
+        pos = body + size + (size & 1)
+        if pos >= file_size:
+            break
+
+    if not byte_rate or data_size is None:
+        return None
+    info["duration"] = data_size / byte_rate * 1000
+    return info
+
+
+# --- FLAC ---
+
+def _parse_flac(f, file_size):
+    info = _new_info()
+    head = f.read(10)
+    start = 0
+    if head[:3] == b"ID3":
+        if len(head) < 10:
+            return None
+        # ID3v2 in front of a FLAC stream: tags need TinyTag, header is still ours
+        info["needs_tags"] = True
+        size = head[6:10]
+        start = 10 + ((size[0] & 0x7F) << 21 | (size[1] & 0x7F) << 14 | (size[2] & 0x7F) << 7 | (size[3] & 0x7F))
+        f.seek(start)
+        head = f.read(4)
+    if head[:4] != b"fLaC":
+        return None
+
+    pos = start + 4
+    total_samples = 0
+    for _ in range(MAX_CHUNKS):
+        f.seek(pos)
+        hdr = f.read(4)
+        if len(hdr) < 4:
+            break
+        last = hdr[0] & 0x80
+        block_type = hdr[0] & 0x7F
+        size = int.from_bytes(hdr[1:4], "big")
+
+        if block_type == 0:  # STREAMINFO
+            si = f.read(34)
+            if len(si) < 34:
+                return None
+            packed = int.from_bytes(si[10:18], "big")
+            info["samplerate"] = packed >> 44
+            info["channels"] = ((packed >> 41) & 0x07) + 1
+            info["bitdepth"] = ((packed >> 36) & 0x1F) + 1
+            total_samples = packed & 0xFFFFFFFFF
+        elif block_type == 4:  # VORBIS_COMMENT
+            if size > MAX_TEXT_BLOCK:
+                info["needs_tags"] = True
+            else:
+                _parse_vorbis_comment(f.read(size), info)
+
+        pos += 4 + size
+        if last or pos >= file_size:
+            break
+
+    if not info["samplerate"]:
+        return None
+    info["duration"] = total_samples / info["samplerate"] * 1000
+    return info
+
+
+def _parse_vorbis_comment(block, info):
+    try:
+        vendor_len = struct.unpack_from("<I", block, 0)[0]
+        i = 4 + vendor_len
+        count = struct.unpack_from("<I", block, i)[0]
+        i += 4
+        for _ in range(count):
+            length = struct.unpack_from("<I", block, i)[0]
+            entry = block[i + 4:i + 4 + length].decode("utf-8", "replace")
+            i += 4 + length
+            key, sep, value = entry.partition("=")
+            field = VORBIS_TAGS.get(key.upper())
+            if sep and field and not info[field]:
+                info[field] = value.strip()
+    except struct.error:
+        info["needs_tags"] = True # Truncated block, let TinyTag try
+
+
+# --- AIFF / AIFC ---
+
+def _ieee_extended(b):
+    # 80-bit IEEE 754 extended float, used for the AIFF sample rate
+    exponent = ((b[0] & 0x7F) << 8) | b[1]
+    mantissa = int.from_bytes(b[2:10], "big")
+    if exponent == 0 and mantissa == 0:
+        return 0.0
+    if exponent > 16383 + 63:
+        return 0.0 # Over 2^64 Hz (or inf/NaN): a garbage exponent, no usable sample rate
+    value = mantissa * 2.0 ** (exponent - 16383 - 63)
+    return -value if b[0] & 0x80 else value
+
+
+def _parse_aiff(f, file_size):
+    head = f.read(12)
+    if len(head) < 12 or head[:4] != b"FORM" or head[8:12] not in (b"AIFF", b"AIFC"):
+        return None
+    info = _new_info()
+    frames = 0
+    pos = 12
+
+    for _ in range(MAX_CHUNKS):
+        f.seek(pos)
+        hdr = f.read(8)
+        if len(hdr) < 8:
+            break
+        cid, size = hdr[:4], struct.unpack(">I", hdr[4:])[0]
+
+        if cid == b"COMM":
+            comm = f.read(18)
+            if len(comm) < 18:
+                return None
+            channels, frames, bits = struct.unpack(">HIH", comm[:8])
+            info["channels"], info["bitdepth"] = channels, bits
+            info["samplerate"] = int(_ieee_extended(comm[8:18]))
+        elif cid in AIFF_TEXT_TAGS and size <= MAX_TEXT_BLOCK:
+            info[AIFF_TEXT_TAGS[cid]] = _text(f.read(size))
+        elif cid in (b"ID3 ", b"id3 "):
+            info["needs_tags"] = True
+
+        pos += 8 + size + (size & 1)
+        if pos >= file_size:
+            break
+
+    if not info["samplerate"]:
+        return None
+    info["duration"] = frames / info["samplerate"] * 1000
+    return info
+
+
+PARSERS = {
+    ".wav": _parse_wav,
+    ".flac": _parse_flac,
+    ".aif": _parse_aiff,
+    ".aiff": _parse_aiff,
+}
+
+
+def parse_header(file_path):
+    """Read format info (and simple tags) straight from the container header.
+
+    Returns a dict with ``duration`` (ms), ``samplerate``, ``bitdepth``,
+    ``channels``, ``title``/``artist``/``track`` (None when absent) and
+    ``needs_tags`` (True if the file carries tags this module can't decode).
+    Returns None for unsupported or malformed files.
+    """
+    parser = PARSERS.get(os.path.splitext(file_path)[1].lower())
+    if parser is None:
+        return None
+    try:
+        with open(file_path, "rb") as f:
+            return parser(f, os.fstat(f.fileno()).st_size)
+    except Exception as e:
+        # A malformed file must not abort the folder scan it's part of
+        if not isinstance(e, (OSError, ValueError, struct.error)):
+            print(f"Cannot parse header of {os.path.basename(file_path)}: {e!r}")
+        return None
@@ -1,8 +1,66 @@
 import flet as ft
-from tinytag import TinyTag
 import os
 import base64
-import re
+import threading
+import time
+
+from art_cache import ArtCache, art_cache_budget
+from art_store import ArtStore, web_index_path
+from gapless import read_gapless_info, trim_ms
+from metadata_cache import MetadataCache
+from pcm_engine import EngineAudio, PcmEngine, sink_from_spec
+from playlist_store import PlaylistStore
+from prefetch import Prefetcher
+from render_stats import RenderStats
+from scanner import DEFAULT_WORKERS, ScanCancelled, ScanJob, rescan_folder, scan_files
+
+SCAN_PROGRESS_INTERVAL = 0.25 # seconds between scan progress refreshes
+SEARCH_DEBOUNCE = 0.15 # seconds of typing pause before the queue is filtered
+SEARCH_LIMIT = 500 # Most search results listed in the queue
+
+# Virtualized queue: only QUEUE_WINDOW tile controls exist, whatever the queue
+# length; they are rebound to other tracks as the list scrolls. Spacers above
+# and below the window stand in for the tiles that aren't built.
+QUEUE_TILE_HEIGHT = 48 # px, fixed so scroll offset <-> queue row is arithmetic
+QUEUE_WINDOW = 60 # Tiles in the pool (a screenful plus overscan both ways)
+QUEUE_OVERSCAN = 15 # Tiles kept above the first visible one
+HEADER_HEIGHT = 860 # px, approximate height of the player header above the queue
+
+# Album art reaches the client by reference: Image.src is the art file's path
+# (desktop/mobile clients read it from disk) or, in web mode, a URL under the
+# assets route, which the browser caches. Art file names are content hashes, so
+# a URL never changes meaning. "base64" inlines the bytes in the control
+# instead, for clients that can't see this machine's files.
+ART_DELIVERY = os.environ.get("HIRES_ART_DELIVERY", "url")
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets") # ft.app's default assets_dir
+ART_ROUTE = "art_cache" # Web mode keeps the art images in ASSETS_DIR/ART_ROUTE, served at /art_cache/...
+
+# Gapless mode: the next queue entry is loaded on a second, paused player while
+# the current one plays, and started when the current track's real audio ends
+# (before any encoder padding) instead of after "completed" and a fresh load
+GAPLESS_ARM_MS = 3000 # Time the switch with a timer from this close to the end
+
+# "flet": ft.Audio, decoded and played by the client. "engine": WAV/FLAC decoded
+# in this process (pcm_engine) and played through HIRES_ENGINE_SINK ("device",
+# "null" or "wav:<path>"); it joins queued tracks sample-accurately by itself.
+AUDIO_BACKEND = os.environ.get("HIRES_AUDIO_BACKEND", "flet")
+ENGINE_SINK = os.environ.get("HIRES_ENGINE_SINK", "device")
+
+POSITION_UPDATES_PER_SECOND = 4 # Max progress slider/time refreshes sent to the client
+RENDER_STATS_REFRESH = 1.0 # seconds between debug overlay refreshes
+
+# After a track starts, the art of its neighbours in the queue is prepared in
+# the background so skipping to them doesn't wait on the disk
+PREFETCH_NEXT = 3 # Queue entries after the playing one
+PREFETCH_PREV = 1 # Queue entries before it
+PREFETCH_BUDGET_FRACTION = 0.25 # Share of the art cache budget prefetching may fill
+# The art of newly scanned files is hashed into the art store afterwards, on a
+# low-priority thread, so the scan itself only reads headers
+ART_INDEX_DELAY = 5.0 # seconds after a scan before that starts
+
+# Always on (a few counters per refresh) so production builds can be inspected too
+render_stats = RenderStats()
+render_stats.hook_flet(ft)
 
 def main(page: ft.Page):
     # 1. Page Configuration
@@ -16,14 +74,40 @@ def main(page: ft.Page):
     page.window_width = 390
     page.window_height = 844
 
+    # Every page.update() (and control.update(), which goes through it) is timed
+    page.update = render_stats.measure("page.update")(page.update)
+
     # State variables
-    current_track = None # Dictionary
+    current_track = None # Track
     is_playing = False
     duration = 0  # in milliseconds
-    playlist = [] # List of dicts: {path, title, artist, duration, ext, filename}
+    playlist = PlaylistStore() # Columnar; playlist[i] yields a Track (path, title, artist, duration, ext, track)
     current_playlist_index = -1
     playback_rate = 1.0
     current_sort_key = "File Name"
+    scan_workers = DEFAULT_WORKERS # Threads used for metadata extraction on folder scans
+    metadata_cache = MetadataCache() # Unchanged files (same size + mtime) skip TinyTag entirely
+    library_root = None # Folder the playlist was scanned from
+    library_state = {} # path -> (size, mtime_ns) as of the last scan of library_root
+    scan_job = None # ScanJob of the folder scan in progress, if any
+    search_query = "" # Queue filter typed into search_field ("" shows everything)
+    search_timer = None # Pending debounced search
+    search_fuzzy = False # Typo-tolerant trigram matching instead of word prefixes
+    slider_dragging = False # No position updates while the user drags the slider
+    gapless = False # Preload the next track and switch to it at the end of the current one (timer based, approximate)
+    current_gapless = None # GaplessInfo (encoder delay/padding) of current_track, if it has any
+    standby_track = None # Track loaded on standby_player, ready to start
+    standby_gapless = None # Its GaplessInfo
+    standby_duration = 0 # Its duration as reported by standby_player, in milliseconds
+    gapless_timer = None # threading.Timer that starts the standby track on time
+    track_lock = threading.RLock() # Track changes come from UI events, the gapless timer and engine events
+    last_position_update = 0.0 # time.monotonic() of the last position refresh
+    art_cache = ArtCache(art_cache_budget(page.platform)) # Encoded art variants recently shown ("base64" delivery)
+    # Downscaled art on disk, rendered once per distinct cover. In web mode the
+    # images are served from the assets dir; the index (file paths) stays private.
+    art_store = ArtStore(os.path.join(ASSETS_DIR, ART_ROUTE), index_path=web_index_path()) if page.web else ArtStore()
+    prefetcher = None # Prefetcher warming the art of the tracks around the playing one (created below)
+    art_indexer = None # Prefetcher hashing the art of scanned files into art_store (created below)
 
     # --- HELPER FUNCTIONS ---
     def format_time(milliseconds):
@@ -33,105 +117,214 @@ def main(page: ft.Page):
         seconds = seconds % 60
         return f"{minutes}:{seconds:02d}"
 
-    def get_album_art_base64(file_path):
+    def read_file_base64(file_path):
         try:
-            tag = TinyTag.get(file_path, image=True)
-            image_data = tag.get_image()
-            if image_data:
-                return base64.b64encode(image_data).decode('utf-8')
-        except Exception:
-            pass
-        return None
+            with open(file_path, "rb") as f:
+                return base64.b64encode(f.read()).decode('utf-8')
+        except OSError:
+            return None
 
-    def extract_metadata(file_path):
-        filename = os.path.basename(file_path)
-        ext = os.path.splitext(filename)[1].replace('.', '').upper()
-        
-        try:
-            tag = TinyTag.get(file_path, image=False) # Image loaded on demand
-            title = tag.title if tag.title else filename
-            artist = tag.artist if tag.artist else "Unknown Artist"
-            dur = tag.duration * 1000 if tag.duration else 0
-            
-            # Extract Track Number
-            track_num = 0
-            if tag.track:
-                try:
-                    # Handle "1/12" format
-                    t_str = str(tag.track).split('/')[0]
-                    track_num = int(t_str) if t_str.isdigit() else 0
-                except:
-                    track_num = 0
-            
-            return {
-                "path": file_path,
-                "title": title,
-                "artist": artist,
-                "duration": dur,
-                "ext": ext,
-                "filename": filename,
-                "track": track_num
-            }
-        except Exception as e:
-            print(f"Error reading {filename}: {e}")
-            return {
-                "path": file_path,
-                "title": filename,
-                "artist": "Unknown",
-                "duration": 0,
-                "ext": ext,
-                "filename": filename,
-                "track": 0
-            }
-
-    def natural_sort_key(s):
-        # Splits string into list of strings and integers: "foo20bar" -> ["foo", 20, "bar"]
-        return [int(text) if text.isdigit() else text.lower()
-                for text in re.split('([0-9]+)', str(s))]
+    def index_art(file_path):
+        # Hash the file's art into the art store, so a folder's cover is rendered
+        # once per album and playing/listing never parses tags. Holds no memory.
+        art_store.digest(file_path)
+        return 0
+
+    def art_indexed():
+        # Queue thumbnails come from the index only; show the ones just added
+        art_store.flush()
+        update_main_view()
+
+    def index_scanned(paths):
+        art_indexer.schedule(paths, float("inf"))
+        # New titles/artists into the fuzzy search index, off the scan and UI threads
+        threading.Thread(target=metadata_cache.index_fuzzy, name="fuzzy-index", daemon=True).start()
+
+    def show_art(image, art_file):
+        # Point an Image at an art store file, per ART_DELIVERY
+        if ART_DELIVERY == "base64":
+            image.src_base64 = art_cache.get(art_file, read_file_base64)
+            image.src = ""
+        elif page.web:
+            image.src = "/" + os.path.relpath(art_file, ASSETS_DIR).replace(os.sep, "/")
+            image.src_base64 = None
+        else:
+            image.src = art_file
+            image.src_base64 = None
+
+    def warm_track_art(file_path):
+        # Prefetch job: everything load_track will ask the art store (and cache) for
+        fg = art_store.variant_path(file_path, "foreground")
+        bg = art_store.variant_path(file_path, "background") if fg else None
+        if ART_DELIVERY != "base64":
+            return 0 # Nothing held in memory: the client loads the files by reference
+        return sum(len(art_cache.get(f, read_file_base64) or "") for f in (fg, bg) if f)
+
+    def prefetch_neighbours():
+        # Most likely next first: the track play_next picks, then the rest ahead, then behind.
+        # Titles/artists for the header are already in the playlist store; only art hits the disk.
+        count = len(playlist)
+        if count < 2:
+            return
+        positions = [next_position()]
+        positions += [(current_playlist_index + k) % count for k in range(1, PREFETCH_NEXT + 1)]
+        positions += [(current_playlist_index - k) % count for k in range(1, PREFETCH_PREV + 1)]
+        seen = {current_playlist_index}
+        paths = []
+        for p in positions:
+            if p not in seen:
+                seen.add(p)
+                paths.append(playlist[p].path)
+        prefetcher.schedule(paths, int(art_cache.max_bytes * PREFETCH_BUDGET_FRACTION))
+
+    def show_scan_progress(job):
+        scan_progress_bar.value = None # Indeterminate until the walk is done
+        scan_status_text.value = "Scanning..."
+        scan_progress.visible = True
+        page.update()
+        threading.Thread(target=watch_scan_progress, args=(job,), daemon=True).start()
+
+    def hide_scan_progress():
+        scan_progress.visible = False
+        page.update()
+
+    def watch_scan_progress(job):
+        # Throttled: one header refresh per SCAN_PROGRESS_INTERVAL, however fast files are parsed
+        while job.finished is None and not job.cancelled:
+            scan_progress_bar.value = job.fraction
+            scan_status_text.value = str(job)
+            try:
+                scan_progress.update()
+            except Exception:
+                pass # Header was rebuilt and the row not attached yet
+            time.sleep(SCAN_PROGRESS_INTERVAL)
+
+    def toggle_render_stats(e):
+        render_stats_panel.visible = not render_stats_panel.visible
+        render_stats_text.value = "\n".join((render_stats.overlay_text(), art_cache.summary_text(), art_store.summary_text()))
+        render_stats_panel.update()
+        if render_stats_panel.visible:
+            threading.Thread(target=watch_render_stats, daemon=True).start()
+
+    def watch_render_stats():
+        while render_stats_panel.visible:
+            time.sleep(RENDER_STATS_REFRESH)
+            render_stats_text.value = "\n".join((render_stats.overlay_text(), art_cache.summary_text(), art_store.summary_text()))
+            try:
+                render_stats_text.update()
+            except Exception:
+                pass
+
+    def dump_render_stats(e):
+        path = render_stats.dump_json()
+        print(f"Render stats written to {path}")
+
+    def cancel_scan(e):
+        if scan_job:
+            scan_job.cancel()
+            scan_status_text.value = "Cancelling..."
+            scan_progress.update()
+
+    def on_search_change(e):
+        nonlocal search_timer
+        # Debounced: a burst of keystrokes runs a single query once typing pauses
+        if search_timer:
+            search_timer.cancel()
+        search_timer = threading.Timer(SEARCH_DEBOUNCE, apply_search, args=(e.control.value,))
+        search_timer.daemon = True
+        search_timer.start()
+
+    def apply_search(query):
+        nonlocal search_query
+        if query == search_query: return
+        search_query = query
+        update_main_view()
+
+    def toggle_fuzzy_search(e):
+        nonlocal search_fuzzy
+        search_fuzzy = not search_fuzzy
+        btn_search_fuzzy.icon_color = ft.Colors.CYAN_400 if search_fuzzy else ft.Colors.GREY_500
+        update_main_view()
+
+    def search_queue(query):
+        # Queue positions to list for query; None means the whole queue
+        if not query:
+            return None
+        if search_fuzzy:
+            # Ranked best match first, from the trigram index stored with the metadata cache.
+            # The index holds strings of every library ever scanned, so the limit
+            # applies after mapping to this queue, not to the string matches.
+            return playlist.rank_strings(metadata_cache.fuzzy_search(query, limit=None), limit=SEARCH_LIMIT)
+        return playlist.search(query, limit=SEARCH_LIMIT)
 
     # --- EVENT HANDLERS ---
     
     def on_file_picked(files):
-        nonlocal current_track, playlist, current_playlist_index
+        nonlocal current_track, playlist, current_playlist_index, library_root, library_state
         if files and len(files) > 0:
-            new_tracks = []
-            for f in files:
-                new_tracks.append(extract_metadata(f.path))
-            
-            playlist = new_tracks
+            new_tracks, _ = scan_files([f.path for f in files], workers=scan_workers, extract=metadata_cache.extract)
+            metadata_cache.flush()
+            index_scanned(t.path for t in new_tracks)
+
+            playlist = PlaylistStore(new_tracks)
             current_playlist_index = 0
+            library_root, library_state = None, {} # Next folder pick is a full scan
             if playlist:
                 load_track(playlist[0])
+            playlist.build_search_index()
             update_main_view()
 
     def on_folder_picked(path):
-        nonlocal playlist, current_playlist_index
+        nonlocal playlist, current_playlist_index, library_root, library_state, scan_job
         if path:
-            supported_ext = ('.mp3', '.flac', '.wav', '.m4a', '.alac')
-            new_playlist = []
             try:
-                # Show loading? (Blocking for now, simpler)
-                for root, dirs, files in os.walk(path):
-                    for file in files:
-                        if file.lower().endswith(supported_ext):
-                            full_path = os.path.join(root, file)
-                            new_playlist.append(extract_metadata(full_path))
-                
-                if new_playlist:
+                # Re-picking the loaded folder only re-reads new/changed files
+                incremental = bool(playlist) and library_root == os.path.abspath(path)
+                if scan_job:
+                    scan_job.cancel() # Only one scan at a time
+                prefetcher.cancel() # Leave the disk to the scan
+                art_indexer.cancel()
+                job = scan_job = ScanJob(path)
+                show_scan_progress(job)
+                try:
+                    diff = rescan_folder(path, library_state if incremental else {},
+                                         workers=scan_workers, extract=metadata_cache.extract, job=job)
+                except ScanCancelled:
+                    print(f"Scan cancelled: {job}")
+                    return # Current playlist stays as it was
+                finally:
+                    metadata_cache.flush()
+                    if scan_job is job:
+                        scan_job = None
+                        hide_scan_progress()
+                print(f"Scanned {diff.stats} (cache: {metadata_cache.hits} hits, {metadata_cache.misses} misses)")
+                index_scanned([t.path for t in diff.added] + [t.path for t in diff.modified])
+
+                if incremental:
+                    if diff:
+                        current_path = playlist[current_playlist_index].path if 0 <= current_playlist_index < len(playlist) else None
+                        playlist.apply_rescan(diff)
+                        playlist.sort(current_sort_key)
+                        if current_path in playlist:
+                            current_playlist_index = playlist.index_of(current_path)
+                        else:
+                            current_playlist_index = min(current_playlist_index, len(playlist) - 1)
+                    print(f"Rescanned library ({diff}), {len(playlist)} tracks.")
+                elif diff.added:
+                    new_playlist = PlaylistStore(diff.added)
                     # Apply current sort
-                    if current_sort_key == "Title":
-                         new_playlist.sort(key=lambda x: natural_sort_key(x.get('title', '')))
-                    elif current_sort_key == "Track Number":
-                         new_playlist.sort(key=lambda x: (x.get('track', 0), natural_sort_key(x.get('title', ''))))
-                    else:
-                         new_playlist.sort(key=lambda x: natural_sort_key(x.get('filename', '')))
-                         
+                    new_playlist.sort(current_sort_key)
+
                     playlist = new_playlist
                     current_playlist_index = 0
                     load_track(playlist[0])
                     print(f"Loaded {len(playlist)} tracks.")
                 else:
                     print("No audio files found in folder.")
+                # Only now: if building the queue failed, the next pick must not count as a rescan of it
+                library_root = os.path.abspath(path)
+                library_state = diff.state
+                playlist.build_search_index() # Ready before the first keystroke
             except Exception as err:
                 print(f"Error scanning folder: {err}")
             
@@ -144,212 +337,195 @@ def main(page: ft.Page):
         current_sort_key = sort_key
         print(f"DEBUG: Request to sort by '{sort_key}' (Natural/Track)")
         
-        # Store current playing path to restore index
-        current_path = playlist[current_playlist_index]['path'] if current_playlist_index >= 0 and current_playlist_index < len(playlist) else None
+        # Store current playing row to restore index
+        current_row = playlist.row_id(current_playlist_index) if current_playlist_index >= 0 and current_playlist_index < len(playlist) else None
         
-        if sort_key == "Title":
-            playlist.sort(key=lambda x: natural_sort_key(x.get('title', '')))
-        elif sort_key == "File Name":
-            playlist.sort(key=lambda x: natural_sort_key(x.get('filename', '')))
-        elif sort_key == "Track Number":
-             # Primary sort: Track Number, Secondary: Title
-            playlist.sort(key=lambda x: (x.get('track', 0), natural_sort_key(x.get('title', ''))))
-            
-        print(f"DEBUG: After Sort (First 3): {[t.get('title') for t in playlist[:3]]}")
+        playlist.sort(sort_key) # Switches to the kept permutation, no re-sort
+
+        print(f"DEBUG: After Sort (First 3): {[t.title for t in playlist[:3]]}")
 
         # Restore index
-        if current_path:
-            for i, track in enumerate(playlist):
-                if track['path'] == current_path:
-                    current_playlist_index = i
-                    break
+        if current_row is not None:
+            current_playlist_index = playlist.position(current_row)
         
         update_main_view()
 
-    # Re-renders the entire scrollable view (Header + Queue items)
-    def update_main_view():
-        nonlocal progress_slider, current_time, total_duration
-        
-        # Clear existing controls
-        main_list_view.controls.clear()
-
-        # 1. THE PLAYER HEADER
-        
-        # Recreation of Controls to ensure valid attachment
-        # We preserve current values from the existing objects (or state)
-        current_time_val = current_time.value if hasattr(current_time, 'value') else "0:00"
-        total_duration_val = total_duration.value if hasattr(total_duration, 'value') else "0:00"
-        slider_val = progress_slider.value if hasattr(progress_slider, 'value') else 0
-        slider_max = progress_slider.max if hasattr(progress_slider, 'max') else 100
-
-        current_time = ft.Text(current_time_val, size=12, color=ft.Colors.GREY_300)
-        total_duration = ft.Text(total_duration_val, size=12, color=ft.Colors.GREY_300)
-        progress_slider = ft.Slider(value=slider_val, min=0, max=slider_max, active_color=ft.Colors.WHITE, thumb_color=ft.Colors.WHITE)
-        progress_slider.on_change_end = on_seek
-        
-        # Speed Controls
-        btn_speed_down = ft.IconButton(ft.Icons.REMOVE_CIRCLE_OUTLINE, icon_color=ft.Colors.GREY_300, icon_size=20)
-        btn_speed_down.on_click = lambda e: change_speed(-0.01)
-        btn_speed_up = ft.IconButton(ft.Icons.ADD_CIRCLE_OUTLINE, icon_color=ft.Colors.GREY_300, icon_size=20)
-        btn_speed_up.on_click = lambda e: change_speed(0.01)
-
-        speed_row = ft.Row([
-            ft.Text("Speed:", color=ft.Colors.GREY_400, size=12),
-            btn_speed_down,
-            ft.Text(f"{playback_rate:.2f}x", color=ft.Colors.WHITE, size=12, weight="bold"),
-            btn_speed_up,
-        ], alignment=ft.MainAxisAlignment.CENTER, spacing=5)
-
-        # Play/Pause Button
-        current_icon = ft.Icons.PAUSE_ROUNDED if is_playing else ft.Icons.PLAY_ARROW_ROUNDED
-        btn_play_inner = ft.IconButton(
-                icon=current_icon,
-                icon_color=ft.Colors.BLACK,
-                icon_size=40,
-                bgcolor=ft.Colors.WHITE
-            )
-        btn_play_inner.on_click = toggle_play_pause
-
-        play_btn = ft.Container(
-            content=btn_play_inner,
-            border_radius=50, 
-            bgcolor=ft.Colors.WHITE, 
-            padding=5
-        )
-
-        btn_prev = ft.IconButton(ft.Icons.SKIP_PREVIOUS_ROUNDED, icon_color=ft.Colors.WHITE, icon_size=30)
-        btn_prev.on_click = play_prev
-        btn_next = ft.IconButton(ft.Icons.SKIP_NEXT_ROUNDED, icon_color=ft.Colors.WHITE, icon_size=30)
-        btn_next.on_click = play_next
-
-        current_controls_row = ft.Row(
-            [
-                ft.IconButton(ft.Icons.SHUFFLE, icon_color=ft.Colors.GREY_500),
-                btn_prev,
-                play_btn,
-                btn_next,
-                ft.IconButton(ft.Icons.REPEAT, icon_color=ft.Colors.GREY_500),
-            ],
-            alignment=ft.MainAxisAlignment.SPACE_EVENLY,
-            vertical_alignment=ft.CrossAxisAlignment.CENTER
-        )
+    def jump_to_playing(e):
+        nonlocal current_playlist_index
+        if current_track is None: return
+        # Constant-time lookup through the playlist's path index
+        index = playlist.index_of(current_track.path)
+        if index < 0: return
+        current_playlist_index = index
+        refresh_active_tile()
+        if index not in queue_view:
+            main_list_view.update() # Filtered out by the current search; just restyle
+            return
+        # Search results are at most SEARCH_LIMIT long, so index() is cheap there
+        row = index if isinstance(queue_view, range) else queue_view.index(index)
+        bind_queue_window(row - QUEUE_OVERSCAN)
+        # scroll_to is a method call and sends no property changes: push the
+        # rebound tiles and spacers first, or the client scrolls to stale rows
+        main_list_view.update()
+        main_list_view.scroll_to(offset=HEADER_HEIGHT + row * QUEUE_TILE_HEIGHT, duration=300)
 
-        sort_dd = ft.Dropdown(
-                        options=[
-                            ft.dropdown.Option("File Name"),
-                            ft.dropdown.Option("Title"),
-                            ft.dropdown.Option("Track Number"),
-                        ],
-                        value=current_sort_key,
-                        width=140, # Slightly wider
-                        text_size=12,
-                        height=40,
-                        content_padding=10,
-                        bgcolor=ft.Colors.GREY_900,
-                        color=ft.Colors.WHITE,
-                        border_color=ft.Colors.GREY_700,
-                    )
-        sort_dd.on_change = lambda e: sort_playlist(e.data)
-
-        queue_header_row = ft.Row([
-            ft.Text("Up Next", size=18, weight="bold", color=ft.Colors.WHITE),
-            sort_dd
-        ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN)
-
-        # Build the Header Container
-        header_container = ft.Container(
-            content=ft.Column([
-                ft.Container(height=60), # Top spacing for the Fixed AppBar
-                
-                # Album Art (Foreground)
-                ft.Container(
-                    content=album_art_foreground,
-                    alignment=ft.Alignment(0, 0),
-                    padding=ft.Padding(top=20, bottom=20, left=0, right=0)
-                ),
-                
-                # Track Info
-                track_title,
-                artist_name,
-                
-                ft.Container(height=20),
-                
-                # Progress
-                ft.Row([current_time, ft.Container(expand=True), total_duration], width=320),
-                progress_slider,
-                
-                ft.Container(height=10),
-                
-                # Speed Controls
-                speed_row,
+    # Bound tiles by queue position, so a track change restyles two tiles
+    # instead of rebuilding the list
+    queue_tiles = {}
+    active_tile_index = -1 # Position highlighted in queue_tiles
+    queue_view = range(0) # Queue positions listed below the header (all, or the search matches)
+    window_start = 0 # Row of queue_view bound to the first pooled tile
 
-                ft.Container(height=10),
-                
-                # Controls
-                current_controls_row,
-                
-                ft.Container(height=20),
-                library_actions,
+    def make_queue_tile():
+        # Empty tile for the pool; bind_queue_window fills it in
+        number_text = ft.Text("", color=ft.Colors.GREY_500, width=30, size=12)
+        title_text = ft.Text("", size=14, overflow=ft.TextOverflow.ELLIPSIS)
+        duration_text = ft.Text("", color=ft.Colors.GREY_500, size=11, font_family="monospace")
+        ext_text = ft.Text("", size=9, weight="bold", color=ft.Colors.BLACK)
+        thumb_image = ft.Image(width=32, height=32, fit=ft.ImageFit.COVER, border_radius=4, visible=False)
+        tile = ft.Container(
+            data={"position": -1, "number": number_text, "title": title_text,
+                  "duration": duration_text, "ext": ext_text, "thumb": thumb_image},
+            content=ft.Row([
+                number_text,
+                thumb_image,
                 
-                ft.Container(height=20),
+                # Title
+                ft.Column([title_text], expand=True),
                 
-                queue_header_row,
+                # Metadata (Time | Type)
+                ft.Row([
+                   duration_text,
+                   ft.Container(
+                       content=ext_text,
+                       bgcolor=ft.Colors.GREY_400,
+                       padding=ft.Padding(top=2, bottom=2, left=4, right=4),
+                       border_radius=4
+                   )
+                ], spacing=10, alignment=ft.MainAxisAlignment.END)
                 
-                ft.Container(height=10),
-            ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-            padding=20
+            ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+            height=QUEUE_TILE_HEIGHT,
+            padding=ft.Padding(top=8, bottom=8, left=15, right=15),
+            border_radius=8,
+            ink=True,
+            visible=False
         )
-        
-        main_list_view.controls.append(header_container)
+        tile.on_click = play_queue_tile
+        return tile
 
-        # 2. QUEUE ITEMS
-        for i, track in enumerate(playlist):
-            is_active = (i == current_playlist_index)
-            
-            def play_clicked_track(e, index=i):
-                 nonlocal current_playlist_index
-                 current_playlist_index = index
-                 load_track(playlist[current_playlist_index])
-
-            tile = ft.Container(
-                content=ft.Row([
-                    ft.Text(f"{i+1}", color=ft.Colors.GREY_500, width=30, size=12),
-                    
-                    # Title
-                    ft.Column([
-                        ft.Text(track.get('title', 'Unknown'), 
-                               color=ft.Colors.CYAN_400 if is_active else ft.Colors.WHITE, 
-                               weight="bold" if is_active else "normal",
-                               size=14, overflow=ft.TextOverflow.ELLIPSIS),
-                    ], expand=True),
-                    
-                    # Metadata (Time | Type)
-                    ft.Row([
-                       ft.Text(format_time(track.get('duration', 0)), color=ft.Colors.GREY_500, size=11, font_family="monospace"),
-                       ft.Container(
-                           content=ft.Text(track.get('ext', ''), size=9, weight="bold", color=ft.Colors.BLACK),
-                           bgcolor=ft.Colors.GREY_400,
-                           padding=ft.Padding(top=2, bottom=2, left=4, right=4),
-                           border_radius=4
-                       )
-                    ], spacing=10, alignment=ft.MainAxisAlignment.END)
-                    
-                ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
-                padding=ft.Padding(top=8, bottom=8, left=15, right=15),
-                border_radius=8,
-                bgcolor=ft.Colors.with_opacity(0.1, ft.Colors.WHITE) if is_active else None,
-                ink=True
-            )
-            tile.on_click = play_clicked_track
-            main_list_view.controls.append(tile)
+    def play_queue_tile(e):
+        nonlocal current_playlist_index
+        current_playlist_index = e.control.data["position"]
+        load_track(playlist[current_playlist_index])
+
+    def style_queue_tile(tile, is_active):
+        title_text = tile.data["title"]
+        title_text.color = ft.Colors.CYAN_400 if is_active else ft.Colors.WHITE
+        title_text.weight = "bold" if is_active else "normal"
+        tile.bgcolor = ft.Colors.with_opacity(0.1, ft.Colors.WHITE) if is_active else None
+
+    def refresh_active_tile():
+        nonlocal active_tile_index
+        if active_tile_index == current_playlist_index:
+            return
+        for index, is_active in ((active_tile_index, False), (current_playlist_index, True)):
+            tile = queue_tiles.get(index)
+            if tile is not None:
+                style_queue_tile(tile, is_active)
+        active_tile_index = current_playlist_index
+
+    def refresh_play_button():
+        btn_play_inner.icon = ft.Icons.PAUSE_ROUNDED if is_playing else ft.Icons.PLAY_ARROW_ROUNDED
+
+    def clamp_window(start):
+        return max(0, min(start, len(queue_view) - QUEUE_WINDOW))
+
+    def bind_queue_window(start):
+        # Point the pooled tiles at rows start .. start + QUEUE_WINDOW of queue_view.
+        # Only changed values reach the client on the next update.
+        nonlocal window_start
+        start = clamp_window(start)
+        window_start = start
+        count = len(queue_view)
+        queue_tiles.clear()
+        for j, tile in enumerate(queue_pool):
+            row = start + j
+            if row >= count:
+                tile.visible = False
+                continue
+            position = queue_view[row]
+            track = playlist[position]
+            refs = tile.data
+            refs["position"] = position
+            refs["number"].value = f"{position+1}"
+            refs["title"].value = track.title
+            refs["duration"].value = format_time(track.duration)
+            refs["ext"].value = track.ext
+            # Only covers already in the art store: binding a tile never parses tags
+            thumb_file = art_store.cached_variant_path(track.path, "thumb")
+            refs["thumb"].visible = thumb_file is not None
+            if thumb_file:
+                show_art(refs["thumb"], thumb_file)
+            style_queue_tile(tile, position == current_playlist_index)
+            tile.visible = True
+            queue_tiles[position] = tile
+        queue_top_spacer.height = start * QUEUE_TILE_HEIGHT
+        queue_bottom_spacer.height = max(0, count - start - QUEUE_WINDOW) * QUEUE_TILE_HEIGHT
 
+    def on_queue_scroll(e):
+        first_visible = int((e.pixels - HEADER_HEIGHT) // QUEUE_TILE_HEIGHT)
+        start = clamp_window(first_visible - QUEUE_OVERSCAN)
+        # Rebind once the overscan margin is half used up, not on every pixel
+        if abs(start - window_start) >= QUEUE_OVERSCAN // 2:
+            bind_queue_window(start)
+            main_list_view.update()
+
+    # Refreshes the queue below the header. Only needed when the queue itself
+    # changes (new tracks, sort, search); playback state changes patch the
+    # header and the active tile in place instead. Cost is O(QUEUE_WINDOW),
+    # not O(queue length).
+    @render_stats.measure("update_main_view")
+    def update_main_view():
+        nonlocal active_tile_index, queue_view
+        # QUEUE ITEMS (only the matches while a search is active)
+        matches = search_queue(search_query)
+        queue_view = range(len(playlist)) if matches is None else matches
+        bind_queue_window(window_start)
+        active_tile_index = current_playlist_index
+
+        refresh_play_button()
         # Update the list view
         page.update()
 
+    def with_track_lock(fn):
+        def locked(*args):
+            with track_lock:
+                return fn(*args)
+        return locked
+
+    @render_stats.measure("load_track")
+    @with_track_lock
     def load_track(track_data):
-        nonlocal current_track, duration, is_playing
+        nonlocal current_track, duration, is_playing, audio_player, standby_player, standby_track, current_gapless
         current_track = track_data
-        file_path = track_data['path']
+        file_path = track_data.path
+        cancel_gapless_timer()
+
+        preloaded = standby_track is not None and standby_track.path == file_path
+        if preloaded:
+            # Already loaded and paused on the standby player: start it before
+            # anything else, then silence the old one
+            audio_player, standby_player = standby_player, audio_player
+            standby_track = None
+            current_gapless = standby_gapless
+            lead_in = trim_ms(current_gapless, standby_duration)[0]
+            if lead_in:
+                audio_player.seek(int(lead_in)) # Skip the encoder delay
+            audio_player.resume()
+            standby_player.pause()
+        else:
+            current_gapless = read_gapless_info(file_path)
         
         # Reset UI Values
         current_time.value = "0:00"
@@ -363,33 +539,91 @@ def main(page: ft.Page):
         album_art_image_control.src_base64 = None
         
         # Metadata Display
-        track_title.value = track_data.get('title', 'Unknown')
-        artist_name.value = track_data.get('artist', 'Unknown Artist')
+        track_title.value = track_data.title
+        artist_name.value = track_data.artist
         
-        if track_data.get('duration'):
-            duration = track_data['duration']
+        # No duration event comes for an already loaded source: use the one it sent on preload
+        new_duration = standby_duration if preloaded and standby_duration else track_data.duration
+        if new_duration:
+            duration = new_duration
             total_duration.value = format_time(duration)
             progress_slider.max = duration
         
         # Art extraction (On demand to save memory in list)
-        art_b64 = get_album_art_base64(file_path)
-        if art_b64:
-            img_bg.src_base64 = art_b64
-            img_bg.src = ""
-            album_art_image_control.src_base64 = art_b64
-            album_art_image_control.src = ""
+        art_file = art_store.variant_path(file_path, "foreground")
+        if art_file:
+            show_art(img_bg, art_store.variant_path(file_path, "background") or art_file)
+            show_art(album_art_image_control, art_file)
             
         # Audio Player
-        # Ensure player stops before loading new src to avoid overlap issues
-        audio_player.pause() 
-        audio_player.src = file_path
-        audio_player.playback_rate = playback_rate
-        audio_player.autoplay = True
+        if not preloaded:
+            # Ensure player stops before loading new src to avoid overlap issues
+            audio_player.pause() 
+            audio_player.src = file_path
+            audio_player.playback_rate = playback_rate
+            audio_player.autoplay = True
+            audio_player.update()
         
         is_playing = True
         
-        # Refresh the whole view to highlight current track and update Play/Pause button
-        update_main_view()
+        # Patch only what changed: header texts/art, play button, old and new active tile
+        refresh_play_button()
+        refresh_active_tile()
+        page.update()
+        preload_next()
+        prefetch_neighbours()
+
+    def preload_next():
+        # Load the track play_next will pick on the standby player, paused
+        nonlocal standby_track, standby_gapless, standby_duration
+        if not gapless or len(playlist) < 2:
+            standby_track = None
+            return
+        track = playlist[next_position()]
+        if standby_track is not None and standby_track.path == track.path:
+            return
+        standby_track = track
+        standby_gapless = read_gapless_info(track.path)
+        standby_duration = 0
+        standby_player.src = track.path
+        standby_player.playback_rate = playback_rate
+        standby_player.autoplay = False
+        standby_player.update() # The client opens and buffers it now
+
+    def cancel_gapless_timer():
+        nonlocal gapless_timer
+        if gapless_timer:
+            gapless_timer.cancel()
+            gapless_timer = None
+
+    def arm_gapless_timer(position):
+        # Position events are too coarse to switch on; from GAPLESS_ARM_MS before the
+        # end of the real audio, a timer re-aimed on every event starts the next track
+        nonlocal gapless_timer
+        if AUDIO_BACKEND == "engine":
+            return # The engine moves on to the queued track at its last sample
+        if not gapless or not is_playing or standby_track is None or not duration:
+            return
+        remaining = trim_ms(current_gapless, duration)[1] - position
+        if remaining > GAPLESS_ARM_MS:
+            return
+        cancel_gapless_timer()
+        gapless_timer = threading.Timer(max(0, remaining) / 1000 / playback_rate, advance_after, args=(None, current_track))
+        gapless_timer.daemon = True
+        gapless_timer.start()
+
+    def toggle_gapless(e):
+        nonlocal gapless, standby_track
+        gapless = not gapless
+        btn_gapless.icon_color = ft.Colors.CYAN_400 if gapless else ft.Colors.GREY_500
+        btn_gapless.update()
+        if gapless:
+            preload_next()
+        else:
+            cancel_gapless_timer()
+            standby_track = None
+            if AUDIO_BACKEND == "engine":
+                standby_player.release() # Or the engine still joins into the queued track
         
     def toggle_play_pause(e):
         nonlocal is_playing
@@ -398,78 +632,150 @@ def main(page: ft.Page):
             
         if is_playing:
             audio_player.pause()
+            cancel_gapless_timer()
             is_playing = False
         else:
             audio_player.resume()
             is_playing = True
         
-        # Declarative Update
-        update_main_view()
+        refresh_play_button()
+        btn_play_inner.update()
+
+    def next_position():
+        # Queue position play_next moves to; the prefetcher warms it first
+        return (current_playlist_index + 1) % len(playlist)
 
+    @with_track_lock
+    def advance_after(player, track):
+        # End of a track, from the gapless timer (``track``: the one it was armed for)
+        # or a "completed" event (``player``: the one that sent it). Whichever comes
+        # second finds the track already changed and does nothing.
+        if player is not None and player is not audio_player:
+            return # A gapless switch leaves the old player to complete on its own
+        if track is not None and track is not current_track:
+            return
+        play_next(None)
+
+    @with_track_lock
     def play_next(e):
         nonlocal current_playlist_index
         if playlist and len(playlist) > 0:
-            current_playlist_index = (current_playlist_index + 1) % len(playlist)
+            current_playlist_index = next_position()
             load_track(playlist[current_playlist_index])
 
+    @with_track_lock
     def play_prev(e):
         nonlocal current_playlist_index
         if playlist and len(playlist) > 0:
             current_playlist_index = (current_playlist_index - 1) % len(playlist)
             load_track(playlist[current_playlist_index])
 
+    def on_seek_start(e):
+        nonlocal slider_dragging
+        slider_dragging = True
+
     def on_seek(e):
+        nonlocal slider_dragging
+        slider_dragging = False
         if not current_track:
             return
+        cancel_gapless_timer() # Re-armed by the next position event
         audio_player.seek(int(progress_slider.value))
 
     def on_position_changed(e):
+        nonlocal last_position_update
+        if e.control is not audio_player:
+            return # Standby player
+        try:
+            arm_gapless_timer(int(e.data))
+        except ValueError:
+            pass
+        # Throttled to POSITION_UPDATES_PER_SECOND, skipped while dragging (the
+        # update would yank the thumb back), and both controls go out in one update
+        if slider_dragging:
+            return
+        now = time.monotonic()
+        if now - last_position_update < 1 / POSITION_UPDATES_PER_SECOND:
+            return
+        last_position_update = now
         try:
             curr_pos = int(e.data)
             progress_slider.value = curr_pos
-            current_time.value = format_time(curr_pos)
-            progress_slider.update()
-            current_time.update()
+            time_text = format_time(curr_pos)
+            if time_text == current_time.value:
+                progress_slider.update() # Same second: leave the text alone
+            else:
+                current_time.value = time_text
+                page.update(progress_slider, current_time)
         except Exception as err:
             print(f"Seek Error: {err}")
             pass
 
     def on_duration_changed(e):
-        nonlocal duration
+        nonlocal duration, standby_duration
+        if e.control is not audio_player:
+            try:
+                standby_duration = int(e.data) # Kept for when it becomes the current track
+            except ValueError:
+                pass
+            return
         try:
             duration = int(e.data)
             progress_slider.max = duration
             total_duration.value = format_time(duration)
-            progress_slider.update()
-            total_duration.update()
+            page.update(progress_slider, total_duration)
         except Exception:
             pass
 
     def on_audiostate_changed(e):
         if e.data == "completed":
-            play_next(None)
+            advance_after(e.control, None)
 
     def change_speed(delta):
         nonlocal playback_rate
         playback_rate = max(0.25, min(2.0, playback_rate + delta))
         audio_player.playback_rate = playback_rate
         audio_player.update()
+        if standby_track is not None:
+            standby_player.playback_rate = playback_rate
+            standby_player.update()
+        cancel_gapless_timer() # Re-aimed at the new rate on the next position event
         
-        # Declarative Update
-        update_main_view()
+        speed_label.value = f"{playback_rate:.2f}x"
+        speed_label.update()
 
     # --- CONTROLS INSTANCES ---
     
-    # Audio
-    audio_player = ft.Audio(
-        src="https://loremflickr.com/audio.mp3"
-    )
-    audio_player.autoplay = False
-    audio_player.on_position_changed = on_position_changed
-    audio_player.on_duration_changed = on_duration_changed
-    audio_player.on_state_changed = on_audiostate_changed
-    
-    page.overlay.append(audio_player)
+    # Audio: two players that swap roles on every gapless switch. Handlers tell
+    # them apart by comparing e.control with the current audio_player.
+    def make_audio_player():
+        if AUDIO_BACKEND == "engine":
+            player = EngineAudio(pcm_engine) # Not a control: nothing goes to the client
+        else:
+            player = ft.Audio(
+                src="https://loremflickr.com/audio.mp3"
+            )
+            page.overlay.append(player)
+        player.autoplay = False
+        player.on_position_changed = on_position_changed
+        player.on_duration_changed = on_duration_changed
+        player.on_state_changed = on_audiostate_changed
+        return player
+
+    pcm_engine = PcmEngine(sink_from_spec(ENGINE_SINK)) if AUDIO_BACKEND == "engine" else None
+
+    audio_player = make_audio_player()
+    standby_player = make_audio_player() # Next track, preloaded (gapless mode)
+
+    prefetcher = Prefetcher(warm_track_art)
+    art_indexer = Prefetcher(index_art, delay=ART_INDEX_DELAY, done=art_indexed)
+    def on_disconnect(e):
+        prefetcher.close() # One worker per session in web mode
+        art_indexer.close()
+        art_store.flush()
+        if pcm_engine:
+            pcm_engine.close()
+    page.on_disconnect = on_disconnect
 
 
     
@@ -502,6 +808,7 @@ def main(page: ft.Page):
     current_time = ft.Text("0:00", size=12, color=ft.Colors.GREY_300)
     total_duration = ft.Text("0:00", size=12, color=ft.Colors.GREY_300)
     progress_slider = ft.Slider(value=0, min=0, max=100, active_color=ft.Colors.WHITE, thumb_color=ft.Colors.WHITE)
+    progress_slider.on_change_start = on_seek_start
     progress_slider.on_change_end = on_seek
     
     # FilePicker callbacks
@@ -524,7 +831,7 @@ def main(page: ft.Page):
     
     
     async def on_file_button_click(e):
-        await file_picker.pick_files_async(allow_multiple=True, allowed_extensions=["mp3", "flac", "wav", "m4a", "alac"])
+        await file_picker.pick_files_async(allow_multiple=True, allowed_extensions=["mp3", "flac", "wav", "m4a", "alac", "aif", "aiff"])
     
     async def on_folder_button_click(e):
         await folder_picker.get_directory_path_async()
@@ -540,23 +847,200 @@ def main(page: ft.Page):
         btn_lib_folder
     ], alignment=ft.MainAxisAlignment.CENTER)
 
+    # Scan progress (shown only while a folder scan runs)
+    scan_progress_bar = ft.ProgressBar(width=260, value=None, color=ft.Colors.CYAN_400, bgcolor=ft.Colors.GREY_800)
+    scan_status_text = ft.Text("", size=11, color=ft.Colors.GREY_400)
+    btn_scan_cancel = ft.IconButton(ft.Icons.CLOSE, icon_color=ft.Colors.GREY_300, icon_size=18, tooltip="Cancel scan")
+    btn_scan_cancel.on_click = cancel_scan
+
+    scan_progress = ft.Column([
+        ft.Row([scan_progress_bar, btn_scan_cancel], alignment=ft.MainAxisAlignment.CENTER),
+        scan_status_text,
+    ], horizontal_alignment=ft.CrossAxisAlignment.CENTER, spacing=0, visible=False)
+
+    # Queue search
+    search_field = ft.TextField(
+        hint_text="Search title, artist or file",
+        prefix_icon=ft.Icons.SEARCH,
+        text_size=13,
+        height=40,
+        content_padding=10,
+        border_color=ft.Colors.GREY_700,
+        color=ft.Colors.WHITE,
+        expand=True,
+    )
+    search_field.on_change = on_search_change
+    btn_search_fuzzy = ft.IconButton(ft.Icons.SPELLCHECK, icon_color=ft.Colors.GREY_500, icon_size=20, tooltip="Fuzzy match (typos, accents)")
+    btn_search_fuzzy.on_click = toggle_fuzzy_search
+
+    search_row = ft.Row([search_field, btn_search_fuzzy], spacing=5)
+
     # Main Scrollable View
     main_list_view = ft.ListView(
         expand=True,
         padding=0,
-        spacing=0
+        spacing=0,
+        on_scroll_interval=50 # ms between scroll events from the client
+    )
+    main_list_view.on_scroll = on_queue_scroll
+
+    # Player header: built once, patched in place on state changes.
+    # update_main_view only replaces the queue tiles below it.
+
+    # Speed Controls
+    btn_speed_down = ft.IconButton(ft.Icons.REMOVE_CIRCLE_OUTLINE, icon_color=ft.Colors.GREY_300, icon_size=20)
+    btn_speed_down.on_click = lambda e: change_speed(-0.01)
+    btn_speed_up = ft.IconButton(ft.Icons.ADD_CIRCLE_OUTLINE, icon_color=ft.Colors.GREY_300, icon_size=20)
+    btn_speed_up.on_click = lambda e: change_speed(0.01)
+
+    speed_label = ft.Text(f"{playback_rate:.2f}x", color=ft.Colors.WHITE, size=12, weight="bold")
+    speed_row = ft.Row([
+        ft.Text("Speed:", color=ft.Colors.GREY_400, size=12),
+        btn_speed_down,
+        speed_label,
+        btn_speed_up,
+    ], alignment=ft.MainAxisAlignment.CENTER, spacing=5)
+
+    # Play/Pause Button
+    current_icon = ft.Icons.PAUSE_ROUNDED if is_playing else ft.Icons.PLAY_ARROW_ROUNDED
+    btn_play_inner = ft.IconButton(
+            icon=current_icon,
+            icon_color=ft.Colors.BLACK,
+            icon_size=40,
+            bgcolor=ft.Colors.WHITE
+        )
+    btn_play_inner.on_click = toggle_play_pause
+
+    play_btn = ft.Container(
+        content=btn_play_inner,
+        border_radius=50, 
+        bgcolor=ft.Colors.WHITE, 
+        padding=5
+    )
+
+    btn_prev = ft.IconButton(ft.Icons.SKIP_PREVIOUS_ROUNDED, icon_color=ft.Colors.WHITE, icon_size=30)
+    btn_prev.on_click = play_prev
+    btn_next = ft.IconButton(ft.Icons.SKIP_NEXT_ROUNDED, icon_color=ft.Colors.WHITE, icon_size=30)
+    btn_next.on_click = play_next
+
+    current_controls_row = ft.Row(
+        [
+            ft.IconButton(ft.Icons.SHUFFLE, icon_color=ft.Colors.GREY_500),
+            btn_prev,
+            play_btn,
+            btn_next,
+            ft.IconButton(ft.Icons.REPEAT, icon_color=ft.Colors.GREY_500),
+        ],
+        alignment=ft.MainAxisAlignment.SPACE_EVENLY,
+        vertical_alignment=ft.CrossAxisAlignment.CENTER
+    )
+
+    sort_dd = ft.Dropdown(
+                    options=[
+                        ft.dropdown.Option("File Name"),
+                        ft.dropdown.Option("Title"),
+                        ft.dropdown.Option("Track Number"),
+                    ],
+                    value=current_sort_key,
+                    width=140, # Slightly wider
+                    text_size=12,
+                    height=40,
+                    content_padding=10,
+                    bgcolor=ft.Colors.GREY_900,
+                    color=ft.Colors.WHITE,
+                    border_color=ft.Colors.GREY_700,
+                )
+    sort_dd.on_change = lambda e: sort_playlist(e.data)
+
+    btn_jump_playing = ft.IconButton(ft.Icons.MY_LOCATION, icon_color=ft.Colors.GREY_300, icon_size=20, tooltip="Jump to playing")
+    btn_jump_playing.on_click = jump_to_playing
+
+    queue_header_row = ft.Row([
+        ft.Text("Up Next", size=18, weight="bold", color=ft.Colors.WHITE),
+        ft.Row([btn_jump_playing, sort_dd], spacing=5)
+    ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN)
+
+    # Build the Header Container
+    header_container = ft.Container(
+        content=ft.Column([
+            ft.Container(height=60), # Top spacing for the Fixed AppBar
+            
+            # Album Art (Foreground)
+            ft.Container(
+                content=album_art_foreground,
+                alignment=ft.Alignment(0, 0),
+                padding=ft.Padding(top=20, bottom=20, left=0, right=0)
+            ),
+            
+            # Track Info
+            track_title,
+            artist_name,
+            
+            ft.Container(height=20),
+            
+            # Progress
+            ft.Row([current_time, ft.Container(expand=True), total_duration], width=320),
+            progress_slider,
+            
+            ft.Container(height=10),
+            
+            # Speed Controls
+            speed_row,
+
+            ft.Container(height=10),
+            
+            # Controls
+            current_controls_row,
+            
+            ft.Container(height=20),
+            library_actions,
+            scan_progress,
+            
+            ft.Container(height=20),
+            
+            queue_header_row,
+            search_row,
+            
+            ft.Container(height=10),
+        ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+        padding=20
     )
+    
+    # Virtualized queue: [header, top spacer, pooled tiles, bottom spacer]
+    queue_top_spacer = ft.Container(height=0)
+    queue_bottom_spacer = ft.Container(height=0)
+    queue_pool = [make_queue_tile() for _ in range(QUEUE_WINDOW)]
+
+    main_list_view.controls.extend([header_container, queue_top_spacer, *queue_pool, queue_bottom_spacer])
+
+    btn_render_stats = ft.IconButton(ft.Icons.INSIGHTS, icon_color=ft.Colors.GREY_500, icon_size=20, tooltip="Render stats")
+    btn_render_stats.on_click = toggle_render_stats
+    btn_gapless = ft.IconButton(ft.Icons.ALL_INCLUSIVE, icon_color=ft.Colors.CYAN_400 if gapless else ft.Colors.GREY_500,
+                                icon_size=20, tooltip="Gapless playback")
+    btn_gapless.on_click = toggle_gapless
 
     # AppBar (Fixed Overlay)
     app_bar_row = ft.Row(
         [
             ft.IconButton(ft.Icons.KEYBOARD_ARROW_DOWN, icon_color=ft.Colors.WHITE),
             ft.Text("NOW PLAYING", size=12, weight="bold", color=ft.Colors.GREY_400),
-            ft.IconButton(ft.Icons.MORE_HORIZ, icon_color=ft.Colors.WHITE),
+            ft.Row([btn_gapless, btn_render_stats, ft.IconButton(ft.Icons.MORE_HORIZ, icon_color=ft.Colors.WHITE)], spacing=0),
         ],
         alignment=ft.MainAxisAlignment.SPACE_BETWEEN
     )
 
+    # Render stats debug overlay (toggled from the app bar)
+    render_stats_text = ft.Text("", size=10, color=ft.Colors.GREEN_300, font_family="monospace")
+    btn_render_stats_dump = ft.TextButton("Dump JSON")
+    btn_render_stats_dump.on_click = dump_render_stats
+    render_stats_panel = ft.Container(
+        content=ft.Column([render_stats_text, btn_render_stats_dump], spacing=5),
+        bgcolor=ft.Colors.with_opacity(0.85, ft.Colors.BLACK),
+        padding=10,
+        top=60, left=10, right=10,
+        visible=False
+    )
+
     # --- FINAL COMPOSITION ---
     stack = ft.Stack(
         [
@@ -579,6 +1063,9 @@ def main(page: ft.Page):
             
             # Layer 4: Fixed Header (App Bar)
             ft.Container(content=app_bar_row, padding=ft.Padding(top=5, bottom=5, left=10, right=10), bgcolor=ft.Colors.TRANSPARENT, height=60),
+
+            # Layer 5: Render stats overlay (debug)
+            render_stats_panel,
         ],
         expand=True
     )
@@ -0,0 +1,74 @@
+from tinytag import TinyTag
+import os
+import re
+import unicodedata
+
+from header_parsers import parse_header
+from track import Track
+
+SUPPORTED_EXT = ('.mp3', '.flac', '.wav', '.m4a', '.alac', '.aif', '.aiff')
+MAX_TRACK_NUMBER = 99999 # Larger "track numbers" are dates, catalogue numbers, etc.
+
+_DIGITS = re.compile('([0-9]+)')
+# Combining diacritical mark blocks (accents split off by NFKD)
+_ACCENTS = re.compile('[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]')
+
+
+def parse_track_number(value):
+    # Handle "1/12" format
+    if not value:
+        return 0
+    t_str = str(value).split('/')[0].strip()
+    if not t_str.isdigit():
+        return 0
+    n = int(t_str)
+    return n if n <= MAX_TRACK_NUMBER else 0
+
+
+def extract_metadata(file_path):
+    filename = os.path.basename(file_path)
+    ext = os.path.splitext(filename)[1].replace('.', '').upper()
+
+    # WAV/FLAC/AIFF: format info (and plain text tags) straight from the header
+    info = parse_header(file_path)
+    if info is not None and not info["needs_tags"]:
+        return Track(file_path, info["title"] or filename, info["artist"] or "Unknown Artist",
+                     info["duration"], ext, parse_track_number(info["track"]))
+
+    try:
+        # Header already parsed: TinyTag only has to decode the tags
+        tag = TinyTag.get(file_path, duration=info is None, image=False) # Image loaded on demand
+        title = tag.title if tag.title else filename
+        artist = tag.artist if tag.artist else "Unknown Artist"
+        if info is not None:
+            dur = info["duration"]
+        else:
+            dur = tag.duration * 1000 if tag.duration else 0
+
+        # Extract Track Number
+        try:
+            track_num = parse_track_number(tag.track)
+        except:
+            track_num = 0
+
+        return Track(file_path, title, artist, dur, ext, track_num)
+    except Exception as e:
+        print(f"Error reading {filename}: {e}")
+        return Track(file_path, filename, "Unknown", info["duration"] if info else 0, ext, 0)
+
+
+def fold_text(s):
+    # Case/accent-insensitive form: "Ｅ́tude" and "etude" fold to the same string.
+    # NFKD splits accents off and maps full-width/compat forms to plain ones.
+    s = unicodedata.normalize('NFKD', str(s))
+    if not s.isascii():
+        s = _ACCENTS.sub('', s)
+    return s.casefold()
+
+
+def natural_sort_key(s):
+    # Splits folded string into strings and integers: "Foo20bar" -> ("foo", 20, "bar").
+    # Text and numbers alternate, so two keys never compare str against int.
+    parts = _DIGITS.split(fold_text(s))
+    parts[1::2] = map(int, parts[1::2])
+    return tuple(parts)
@@ -0,0 +1,188 @@
+import os
+import sqlite3
+import threading
+
+import fuzzy_index
+from metadata import extract_metadata
+from storage import app_data_path
+from track import Track
+
+# Bump whenever the table layout or the meaning of a column changes; an older
+# database is dropped and rebuilt on open.
+SCHEMA_VERSION = 2 # 2: fuzzy search trigram tables
+
+# Pending rows are written in one transaction once this many have piled up
+FLUSH_EVERY = 500
+
+
+def default_cache_path():
+    return app_data_path("metadata_cache.sqlite3")
+
+
+class MetadataCache:
+    """On-disk metadata store keyed by (path, size, mtime).
+
+    ``extract(path)`` is a drop-in replacement for ``extract_metadata``: if the
+    file's size and mtime match the stored row, the Track is rebuilt from
+    SQLite without opening the file. Safe to call from scan worker threads.
+
+    Every title and artist written to the cache is also added to a trigram
+    index in the same database (see ``fuzzy_index``), queried by
+    ``fuzzy_search``. That happens in ``index_fuzzy``, not in the scan
+    workers' writes: call it after a scan (``fuzzy_search`` and ``close`` do).
+    """
+
+    def __init__(self, db_path=None, extract=extract_metadata):
+        self.db_path = db_path or default_cache_path()
+        self._extract = extract
+        self._lock = threading.Lock()
+        self._pending = []
+        self._unindexed = set() # Titles/artists written but not in the trigram index yet
+        self.hits = 0
+        self.misses = 0
+
+        if self.db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+        self._unindexed = fuzzy_index.unindexed_strings(self._conn) # Left over if the app quit mid-way
+
+    def _migrate(self):
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        upgrade = version == 1 # Same tracks table, only the fuzzy index is new
+        if version != SCHEMA_VERSION and not upgrade:
+            if version:
+                print(f"Metadata cache schema {version} != {SCHEMA_VERSION}, rebuilding.")
+            self._conn.execute("DROP TABLE IF EXISTS tracks")
+            fuzzy_index.drop_tables(self._conn)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS tracks (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                title TEXT,
+                artist TEXT,
+                duration REAL,
+                ext TEXT,
+                track INTEGER
+            )
+        """)
+        fuzzy_index.create_tables(self._conn)
+        if upgrade:
+            strings = self._conn.execute("SELECT title FROM tracks UNION SELECT artist FROM tracks").fetchall()
+            fuzzy_index.index_strings(self._conn, [s for (s,) in strings])
+        self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.commit()
+
+    # --- LOOKUP ---
+
+    def get(self, path, size, mtime_ns):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT title, artist, duration, ext, track FROM tracks "
+                "WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (path, size, mtime_ns)
+            ).fetchone()
+        if row is None:
+            return None
+        return Track(path, *row)
+
+    def put(self, track, size, mtime_ns):
+        row = (track.path, size, mtime_ns, track.title, track.artist,
+               track.duration, track.ext, track.track)
+        with self._lock:
+            self._pending.append(row)
+            if len(self._pending) >= FLUSH_EVERY:
+                self._flush_locked()
+
+    def extract(self, file_path):
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            # Let the normal path report the error and return its fallback Track
+            return self._extract(file_path)
+
+        cached = self.get(file_path, st.st_size, st.st_mtime_ns)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        track = self._extract(file_path)
+        self.put(track, st.st_size, st.st_mtime_ns)
+        return track
+
+    # --- MAINTENANCE ---
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO tracks (path, size, mtime_ns, title, artist, duration, ext, track) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            self._pending
+        )
+        self._unindexed.update(s for row in self._pending for s in (row[3], row[4]) if s)
+        self._conn.commit()
+        self._pending.clear()
+
+    def index_fuzzy(self):
+        """Add the titles/artists written since the last call to the trigram index.
+
+        The trigrams are built without the lock, so a scan running meanwhile
+        isn't held up; the inserts are batched.
+        """
+        with self._lock:
+            self._flush_locked()
+            if not self._unindexed:
+                return
+            pending, self._unindexed = self._unindexed, set()
+            pending = fuzzy_index.new_strings(self._conn, pending)
+        grams_of = {text: fuzzy_index.trigrams(text) for text in pending}
+        with self._lock:
+            fuzzy_index.add_strings(self._conn, grams_of)
+            self._conn.commit()
+
+    def fuzzy_search(self, query, min_score=fuzzy_index.MIN_SCORE, limit=1000):
+        """Cached titles/artists resembling ``query`` as ``(text, score)``, best first.
+
+        The index covers every file ever cached, not one library: callers that
+        rank a queue should pass ``limit=None`` and limit after mapping.
+        """
+        self.index_fuzzy()
+        with self._lock:
+            return fuzzy_index.search_strings(self._conn, query, min_score, limit)
+
+    def invalidate(self, paths=None):
+        """Forget the given paths, or every cached row when ``paths`` is None."""
+        with self._lock:
+            self._flush_locked()
+            if paths is None:
+                self._conn.execute("DELETE FROM tracks")
+                self._conn.execute("DELETE FROM fuzzy_grams")
+                self._conn.execute("DELETE FROM fuzzy_strings")
+                self._unindexed.clear()
+            else:
+                paths = [(p,) for p in paths]
+                strings = [s for p in paths for s in
+                           self._conn.execute("SELECT title, artist FROM tracks WHERE path = ?", p).fetchone() or ()]
+                self._conn.executemany("DELETE FROM tracks WHERE path = ?", paths)
+                fuzzy_index.prune_strings(self._conn, strings)
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            self._flush_locked()
+            return self._conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+
+    def close(self):
+        self.index_fuzzy()
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
@@ -0,0 +1,669 @@
+import os
+import queue
+import struct
+import threading
+import time
+import wave
+from collections import deque, namedtuple
+
+try:
+    import soundfile
+except ImportError: # FLAC/AIFF need it; WAV is read directly
+    soundfile = None
+
+try:
+    import sounddevice
+except ImportError: # Only the device sink needs it
+    sounddevice = None
+
+# In-process playback: a decoder thread turns the file into PCM blocks, a ring
+# of BLOCK_FRAMES-sized blocks decouples it from an output thread, which hands
+# them to a sink (sound card, WAV file, or nothing). EngineAudio puts the
+# ft.Audio surface main.py uses (src/autoplay/playback_rate, update, pause,
+# resume, seek, on_* events) on top, so the UI runs on either backend.
+
+BLOCK_FRAMES = 4096 # Frames per PCM block (~93 ms at 44.1 kHz)
+RING_BLOCKS = 32 # Blocks decoded ahead of the sink (~3 s at 44.1 kHz, ~1.4 s at 96 kHz)
+POSITION_INTERVAL = 0.2 # seconds of audio between position events
+
+PcmFormat = namedtuple("PcmFormat", ["samplerate", "channels", "sample_width"])
+
+
+class EngineError(Exception):
+    pass
+
+
+def frame_bytes(fmt):
+    return fmt.channels * fmt.sample_width
+
+
+# --- SOURCES ---
+
+class WavSource:
+    """Integer PCM from a RIFF/WAVE file (plain or WAVE_FORMAT_EXTENSIBLE), no dependencies."""
+
+    def __init__(self, path):
+        self._f = open(path, "rb")
+        try:
+            self._parse()
+        except (EngineError, struct.error):
+            self._f.close()
+            raise
+
+    def _parse(self):
+        f = self._f
+        head = f.read(12)
+        if len(head) < 12 or head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+            raise EngineError("not a RIFF/WAVE file")
+        fmt = None
+        pos = 12
+        while True:
+            f.seek(pos)
+            hdr = f.read(8)
+            if len(hdr) < 8:
+                raise EngineError("WAV file without fmt/data chunks")
+            cid, size = hdr[:4], struct.unpack("<I", hdr[4:])[0]
+            if cid == b"fmt ":
+                body = f.read(size)
+                tag, channels, rate = struct.unpack("<HHI", body[:8])
+                bits = struct.unpack("<H", body[14:16])[0]
+                if tag == 0xFFFE and len(body) >= 26: # WAVE_FORMAT_EXTENSIBLE: sub format GUID
+                    tag = struct.unpack("<H", body[24:26])[0]
+                if tag != 1:
+                    raise EngineError(f"WAV format {tag:#x} is not integer PCM")
+                fmt = PcmFormat(rate, channels, (bits + 7) // 8)
+            elif cid == b"data":
+                if fmt is None:
+                    raise EngineError("WAV data chunk before fmt")
+                self.format = fmt
+                self._start = pos + 8
+                end = os.fstat(f.fileno()).st_size
+                if size in (0, 0xFFFFFFFF): # Streamed/unfinished writers leave it unset
+                    size = end - self._start
+                self.frames = min(size, end - self._start) // frame_bytes(fmt)
+                f.seek(self._start)
+                self._pos = 0
+                return
+            pos += 8 + size + (size & 1)
+
+    def read(self, frames):
+        frames = min(frames, self.frames - self._pos)
+        if frames <= 0:
+            return b""
+        fb = frame_bytes(self.format)
+        data = self._f.read(frames * fb)
+        data = data[:len(data) - len(data) % fb]
+        self._pos += len(data) // fb
+        return data
+
+    def seek(self, frame):
+        self._pos = max(0, min(frame, self.frames))
+        self._f.seek(self._start + self._pos * frame_bytes(self.format))
+
+    def close(self):
+        self._f.close()
+
+
+class SoundFileSource:
+    """FLAC (or anything libsndfile reads) through the optional soundfile package."""
+
+    def __init__(self, path):
+        if soundfile is None:
+            raise EngineError(f"Decoding {os.path.splitext(path)[1]} needs the soundfile package")
+        try:
+            self._sf = soundfile.SoundFile(path)
+        except Exception as e:
+            raise EngineError(str(e))
+        # 16-bit stays 16-bit; 24-bit and up come out as left-justified int32
+        self._dtype = "int16" if self._sf.subtype in ("PCM_S8", "PCM_U8", "PCM_16") else "int32"
+        self.format = PcmFormat(self._sf.samplerate, self._sf.channels, 2 if self._dtype == "int16" else 4)
+        self.frames = self._sf.frames
+
+    def read(self, frames):
+        # buffer_read hands back raw interleaved samples, no numpy involved
+        return bytes(self._sf.buffer_read(frames, dtype=self._dtype))
+
+    def seek(self, frame):
+        self._sf.seek(max(0, min(frame, self.frames)))
+
+    def close(self):
+        self._sf.close()
+
+
+def open_source(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".wav":
+        try:
+            return WavSource(path)
+        except EngineError:
+            if soundfile is None:
+                raise
+            return SoundFileSource(path) # Float or compressed WAV
+    if ext in (".flac", ".aif", ".aiff"):
+        return SoundFileSource(path)
+    raise EngineError(f"{ext or path} is not decoded by the PCM engine")
+
+
+# --- SINKS ---
+# open(fmt, samplerate) is called before the first write and again whenever the
+# format or output rate changes; samplerate differs from fmt.samplerate when
+# the playback rate isn't 1.
+
+class NullSink:
+    """Discards the audio, counting it. ``realtime`` paces writes like a sound card."""
+
+    def __init__(self, realtime=False):
+        self.realtime = realtime
+        self.frames = 0
+        self._fb = 1
+        self._rate = 0
+        self._clock = 0.0
+        self._since = 0
+
+    def open(self, fmt, samplerate):
+        self._fb = frame_bytes(fmt)
+        self._rate = samplerate
+        self.resume()
+
+    def write(self, data):
+        frames = len(data) // self._fb
+        self.frames += frames
+        if self.realtime:
+            self._since += frames
+            delay = self._clock + self._since / self._rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def pause(self):
+        pass
+
+    def resume(self):
+        self._clock = time.monotonic()
+        self._since = 0
+
+    def close(self):
+        pass
+
+
+class WavWriterSink:
+    """Writes what the engine plays to a WAV file; a format change starts the next file (name-2.wav, ...)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.paths = [] # Files written so far
+        self._w = None
+        self._key = None
+
+    def open(self, fmt, samplerate):
+        if self._w is not None and self._key == (fmt, samplerate):
+            return
+        self.close()
+        root, ext = os.path.splitext(self.path)
+        path = f"{root}-{len(self.paths) + 1}{ext}" if self.paths else self.path
+        self._w = wave.open(path, "wb")
+        self._w.setnchannels(fmt.channels)
+        self._w.setsampwidth(fmt.sample_width)
+        self._w.setframerate(samplerate)
+        self._key = (fmt, samplerate)
+        self.paths.append(path)
+
+    def write(self, data):
+        self._w.writeframesraw(data)
+
+    def pause(self):
+        pass
+
+    def resume(self):
+        pass
+
+    def close(self):
+        if self._w is not None:
+            self._w.close() # Patches the header sizes
+            self._w = None
+
+
+class DeviceSink:
+    """System audio output through the optional sounddevice package."""
+
+    DTYPES = {1: "uint8", 2: "int16", 3: "int24", 4: "int32"}
+
+    def __init__(self, device=None, latency="low"):
+        if sounddevice is None:
+            raise EngineError("The device sink needs the sounddevice package")
+        self.device = device
+        self.latency = latency
+        self._stream = None
+        self._key = None
+
+    def open(self, fmt, samplerate):
+        if self._stream is not None and self._key == (fmt, samplerate):
+            return
+        self.close()
+        self._stream = sounddevice.RawOutputStream(samplerate=samplerate, channels=fmt.channels,
+                                                   dtype=self.DTYPES[fmt.sample_width],
+                                                   device=self.device, latency=self.latency)
+        self._stream.start()
+        self._key = (fmt, samplerate)
+
+    def write(self, data):
+        self._stream.write(data) # Blocks until the device has room: this paces playback
+
+    def pause(self):
+        if self._stream is not None:
+            self._stream.stop()
+
+    def resume(self):
+        if self._stream is not None and self._stream.stopped:
+            self._stream.start()
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+
+def sink_from_spec(spec):
+    """Sink for a HIRES_ENGINE_SINK style spec: "device", "null" or "wav:<path>"."""
+    if spec == "null":
+        return NullSink(realtime=True)
+    if spec.startswith("wav:"):
+        return WavWriterSink(spec[4:])
+    return DeviceSink()
+
+
+# --- ENGINE ---
+
+class BlockRing:
+    """Bounded queue of blocks between the decoder and output threads.
+
+    ``clear`` drops everything and bumps ``generation``; a ``put`` for an
+    older generation is dropped, so a seek can't be followed by stale audio
+    from a decoder that was mid-block.
+    """
+
+    def __init__(self, capacity=RING_BLOCKS):
+        self.capacity = capacity
+        self.generation = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item, generation):
+        with self._cond:
+            while len(self._items) >= self.capacity and generation == self.generation and not self._closed:
+                self._cond.wait()
+            if generation != self.generation or self._closed:
+                return False
+            self._items.append(item)
+            self._cond.notify_all()
+            return True
+
+    def get(self):
+        """(generation, item), waiting for one; None once closed."""
+        with self._cond:
+            while not self._items and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return self.generation, item
+
+    def clear(self):
+        with self._cond:
+            self._items.clear()
+            self.generation += 1
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class _Stream:
+    __slots__ = ("owner", "source", "path")
+
+    def __init__(self, owner, source, path):
+        self.owner = owner
+        self.source = source
+        self.path = path
+
+    def duration_ms(self):
+        return self.source.frames * 1000 / self.source.format.samplerate
+
+
+def dispatch_to_owner(owner, kind, value):
+    handler = getattr(owner, "engine_event", None)
+    if handler is not None:
+        handler(kind, value)
+
+
+class PcmEngine:
+    """Decodes one track at a time into a sink, with a gapless queue of one.
+
+    ``load`` replaces what plays; ``queue_next`` names the track to follow it.
+    The decoder moves on to the queued track as soon as the current one's
+    last block is in the ring, so the sink gets the two back to back, sample
+    for sample (same format: same open stream). Streams have an ``owner``,
+    passed back with every event as ``listener(owner, kind, value)``:
+    ``("duration", ms)``, ``("position", ms)`` and ``("state", "playing" |
+    "paused" | "stopped" | "completed")``. The default listener calls
+    ``owner.engine_event(kind, value)``.
+
+    Playback rate is varispeed: the sink is opened at rate × the file's
+    sample rate, so pitch follows speed. Positions are in file time.
+    Events are delivered in order on a thread of their own ("pcm-events"):
+    handlers may load the next track or update the UI without holding up the
+    output thread, which only writes audio.
+    """
+
+    def __init__(self, sink, listener=dispatch_to_owner, block_frames=BLOCK_FRAMES, ring_blocks=RING_BLOCKS):
+        self.sink = sink
+        self.listener = listener
+        self.block_frames = block_frames
+        self.rate = 1.0
+        self._ring = BlockRing(ring_blocks)
+        self._lock = threading.Condition()
+        self._play = None   # _Stream being heard
+        self._decode = None # _Stream being decoded (the queued one once _play is fully decoded); None when done
+        self._next = None   # _Stream to follow _play
+        self._frames = 0    # Frames of _play handed to the sink (its position)
+        self._paused = True
+        self._closed = False
+        self._sink_key = None
+        self._events = queue.SimpleQueue() # Batches of (owner, kind, value) for _event_loop; None stops it
+        for target, name in ((self._decode_loop, "pcm-decode"), (self._output_loop, "pcm-output"),
+                             (self._event_loop, "pcm-events")):
+            threading.Thread(target=target, name=name, daemon=True).start()
+
+    # --- COMMANDS ---
+
+    def load(self, path, owner=None, autoplay=True):
+        """Play ``path`` from the start (or hold it paused). Raises EngineError if it can't be decoded."""
+        stream = _Stream(owner, open_source(path), path)
+        with self._lock:
+            old = [s for s in (self._play, self._decode) if s is not None and s is not self._next]
+            self._play = self._decode = stream
+            if self._next is not None and self._next.owner is owner:
+                old.append(self._next)
+                self._next = None
+            self._frames = 0
+            self._paused = not autoplay
+            self._ring.clear()
+            for s in set(old):
+                s.source.close()
+            self._lock.notify_all()
+        self._emit([(owner, "duration", stream.duration_ms()),
+                    (owner, "state", "playing" if autoplay else "paused")])
+
+    def queue_next(self, path, owner=None):
+        """Make ``path`` follow the current track without a gap. Raises EngineError if it can't be decoded."""
+        stream = _Stream(owner, open_source(path), path)
+        with self._lock:
+            old = self._next
+            if old is not None:
+                if self._play is not None and self._decode is not self._play:
+                    # Decoding already moved past the current track into (or through) this one: undo that
+                    self._rewind_locked()
+                old.source.close()
+            self._next = stream
+            self._lock.notify_all()
+        self._emit([(owner, "duration", stream.duration_ms())])
+
+    def unqueue(self, owner=None):
+        """Drop the queued track (only ``owner``'s, if given); the current one then just ends."""
+        with self._lock:
+            old = self._next
+            if old is None or owner is not None and old.owner is not owner:
+                return
+            if self._play is not None and self._decode is not self._play:
+                self._rewind_locked() # As in queue_next
+            old.source.close()
+            self._next = None
+            self._lock.notify_all()
+
+    def pause(self, owner=None):
+        with self._lock:
+            if self._play is None or self._paused or owner is not None and self._play.owner is not owner:
+                return
+            self._paused = True
+            owner = self._play.owner
+        self._emit([(owner, "state", "paused")])
+
+    def resume(self, owner=None):
+        """Resume the current track; for the queued track's owner, skip to it now."""
+        events = []
+        with self._lock:
+            if self._next is not None and owner is not None and self._next.owner is owner \
+                    and (self._play is None or self._play.owner is not owner):
+                old = self._play
+                stream = self._next
+                self._next = None
+                stream.source.seek(0)
+                self._play = self._decode = stream
+                self._frames = 0
+                self._ring.clear()
+                if old is not None:
+                    old.source.close()
+                    events.append((old.owner, "state", "stopped"))
+                events.append((owner, "duration", stream.duration_ms()))
+            elif self._play is None or owner is not None and self._play.owner is not owner:
+                return
+            self._paused = False
+            self._lock.notify_all()
+            events.append((self._play.owner, "state", "playing"))
+        self._emit(events)
+
+    def seek(self, ms, owner=None):
+        with self._lock:
+            play = self._play
+            if play is None or owner is not None and play.owner is not owner:
+                return
+            fmt = play.source.format
+            self._frames = max(0, min(int(ms * fmt.samplerate / 1000), play.source.frames))
+            self._rewind_locked()
+            owner = play.owner
+        self._emit([(owner, "position", self._frames * 1000 / fmt.samplerate)])
+
+    def has(self, owner):
+        """True if ``owner``'s track is current or queued."""
+        with self._lock:
+            return any(s is not None and s.owner is owner for s in (self._play, self._next))
+
+    def set_rate(self, rate):
+        with self._lock:
+            self.rate = rate # The output thread reopens the sink at the new rate
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            streams = {s for s in (self._play, self._decode, self._next) if s is not None}
+            self._play = self._decode = self._next = None
+            self._ring.close()
+            self._lock.notify_all()
+        self._events.put(None)
+        for s in streams:
+            s.source.close()
+        self.sink.close()
+
+    def _rewind_locked(self):
+        # Restart decoding at the play position, dropping everything decoded past it
+        if self._decode is not None and self._decode is not self._play:
+            self._decode.source.seek(0) # The queued track, started early: it goes again after _play
+        self._play.source.seek(self._frames)
+        self._decode = self._play
+        self._ring.clear()
+        self._lock.notify_all()
+
+    # --- THREADS ---
+
+    def _emit(self, events):
+        if events:
+            self._events.put(events)
+
+    def _event_loop(self):
+        while True:
+            events = self._events.get()
+            if events is None:
+                return
+            for owner, kind, value in events:
+                try:
+                    self.listener(owner, kind, value)
+                except Exception as e:
+                    print(f"PCM engine {kind} handler failed: {e}")
+
+    def _decode_loop(self):
+        while True:
+            with self._lock:
+                while not self._closed and self._decode is None:
+                    self._lock.wait()
+                if self._closed:
+                    return
+                stream = self._decode
+                generation = self._ring.generation
+                # Reading under the lock keeps commands from closing/seeking the source mid-read;
+                # a block is a few ms of work
+                try:
+                    data = stream.source.read(self.block_frames)
+                except Exception as e:
+                    print(f"Decoding {os.path.basename(stream.path)} failed: {e}")
+                    data = b""
+                if data:
+                    item = ("pcm", stream, data)
+                elif self._next is not None and self._next is not stream:
+                    # Gapless: the queued track's first block goes right behind this one's last
+                    self._decode = self._next
+                    self._decode.source.seek(0)
+                    item = ("start", self._decode, None)
+                else:
+                    self._decode = None
+                    item = ("end", stream, None)
+            self._ring.put(item, generation) # Waits while the ring is full
+
+    def _output_loop(self):
+        while True:
+            got = self._ring.get()
+            if got is None:
+                return
+            generation, (kind, stream, data) = got
+            with self._lock:
+                paused = self._paused
+            if paused:
+                self.sink.pause()
+                with self._lock:
+                    while self._paused and not self._closed and self._ring.generation == generation:
+                        self._lock.wait()
+                self.sink.resume()
+
+            events = []
+            with self._lock:
+                if self._closed:
+                    return
+                if self._ring.generation != generation:
+                    continue # Seek or load while we held this block
+                if kind == "start":
+                    old = self._play
+                    self._play = stream
+                    if self._next is stream:
+                        self._next = None
+                    self._frames = 0
+                    if old is not None and old is not stream:
+                        old.source.close()
+                        events.append((old.owner, "state", "completed"))
+                    events += [(stream.owner, "duration", stream.duration_ms()), (stream.owner, "state", "playing")]
+                elif kind == "end":
+                    self._paused = True
+                    events.append((stream.owner, "state", "completed"))
+                else:
+                    fmt = stream.source.format
+                    key = (fmt, max(1, round(fmt.samplerate * self.rate)))
+                    before = self._frames
+                    self._frames += len(data) // frame_bytes(fmt)
+                    frames = self._frames
+            if kind == "pcm":
+                try:
+                    if key != self._sink_key:
+                        self.sink.open(*key)
+                        self._sink_key = key
+                    self.sink.write(data)
+                except Exception as e:
+                    print(f"Audio output failed: {e}")
+                    with self._lock:
+                        self._paused = True
+                    self._sink_key = None
+                    events.append((stream.owner, "state", "stopped"))
+                interval = max(1, int(fmt.samplerate * POSITION_INTERVAL))
+                if frames // interval != before // interval:
+                    events.append((stream.owner, "position", frames * 1000 / fmt.samplerate))
+            self._emit(events)
+
+
+# --- FLET ADAPTER ---
+
+EngineEvent = namedtuple("EngineEvent", ["control", "data"]) # Shaped like the ft.Audio events main.py reads
+
+
+class EngineAudio:
+    """Stand-in for ft.Audio backed by a PcmEngine; several can share one engine.
+
+    Same attributes and calls as main.py makes on ft.Audio. ``update`` applies
+    them: a new ``src`` with ``autoplay`` starts it, without ``autoplay`` it
+    is queued to follow the engine's current track (what gapless mode's
+    standby player wants). ``pause``/``resume``/``seek`` act on the engine
+    when this player's track is current; ``resume`` on the player whose
+    track is queued skips to it.
+    """
+
+    def __init__(self, engine, src=None):
+        self.engine = engine
+        self.src = src
+        self.autoplay = False
+        self.playback_rate = 1.0
+        self.volume = 1.0 # Accepted for compatibility; the engine plays at full scale
+        self.on_position_changed = None
+        self.on_duration_changed = None
+        self.on_state_changed = None
+        self._loaded_src = None
+
+    def update(self):
+        if self.src and (self.src != self._loaded_src or not self.engine.has(self)):
+            self._loaded_src = self.src
+            try:
+                if self.autoplay:
+                    self.engine.load(self.src, owner=self)
+                else:
+                    self.engine.queue_next(self.src, owner=self)
+            except EngineError as e:
+                print(f"PCM engine can't play {os.path.basename(self.src)}: {e}")
+                self.engine_event("state", "stopped")
+        if self.playback_rate != self.engine.rate:
+            self.engine.set_rate(self.playback_rate)
+
+    def play(self):
+        self.update()
+        self.engine.seek(0, owner=self)
+        self.engine.resume(owner=self)
+
+    def pause(self):
+        self.engine.pause(owner=self)
+
+    def resume(self):
+        self.engine.resume(owner=self)
+
+    def seek(self, position_milliseconds):
+        self.engine.seek(position_milliseconds, owner=self)
+
+    def release(self):
+        self.engine.pause(owner=self)
+        self.engine.unqueue(owner=self)
+        self._loaded_src = None
+
+    def engine_event(self, kind, value):
+        handler = {"state": self.on_state_changed, "duration": self.on_duration_changed,
+                   "position": self.on_position_changed}.get(kind)
+        if handler is not None:
+            handler(EngineEvent(self, value if kind == "state" else str(int(value))))
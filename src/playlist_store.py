@@ -0,0 +1,433 @@
+from array import array
+import bisect
+import os
+
+from metadata import MAX_TRACK_NUMBER, natural_sort_key
+from search_index import SearchIndex
+from track import Track
+
+try:
+    import numpy as np
+except ImportError: # Optional: the pure-Python paths below give the same results
+    np = None
+
+
+def _track_number(n):
+    # track_numbers is a C int array; rows cached before parse_track_number
+    # capped the value could still hold anything
+    return n if n and 0 < n <= MAX_TRACK_NUMBER else 0
+
+
+class StringTable:
+    """Append-only string pool; each distinct string is stored once and
+    referenced by its integer id. Its natural sort key is computed once, when
+    the string is first added, and kept in ``keys``."""
+
+    def __init__(self):
+        self.strings = []
+        self.keys = []
+        self._ids = {}
+
+    def add(self, s):
+        i = self._ids.get(s)
+        if i is None:
+            i = self._ids[s] = len(self.strings)
+            self.strings.append(s)
+            self.keys.append(natural_sort_key(s))
+        return i
+
+    def id_of(self, s, default=-1):
+        return self._ids.get(s, default)
+
+    def __getitem__(self, i):
+        return self.strings[i]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class PlaylistStore:
+    """Struct-of-arrays playlist.
+
+    Durations and track numbers live in ``array`` columns; title, artist and
+    ext are ids into a shared ``StringTable``. Rows are materialized into
+    ``Track`` objects only when indexed or iterated, so the UI code keeps
+    working with ``playlist[i].title`` while a 1M-track library costs a few
+    machine words per row instead of a Python object per field.
+
+    Columns stay in the order rows were added ("row ids"). What the queue
+    shows is a permutation of row ids per sort key, built on first use and
+    then kept up to date as rows are added, changed or removed, so switching
+    the sort dropdown back and forth is a pointer swap. Each permutation's
+    inverse (row id -> position) is built on demand, which makes "where did
+    the playing track move to" an O(1) lookup.
+
+    A path appears at most once: a path -> row id dict is kept in sync with
+    every add, change and removal, so ``index_of(path)``, ``path in playlist``
+    and skipping duplicates on add are constant time.
+
+    ``search(text)`` is served by a ``SearchIndex`` over title, artist and
+    filename. It is built by ``build_search_index()`` (or the first search),
+    then updated along with added and changed rows; removing rows drops it.
+
+    Sorting, filtering and total duration run over whole columns (NumPy when
+    installed, plain loops over the arrays otherwise).
+    """
+
+    # Adding more than 1/REBUILD_FRACTION of the current rows at once drops
+    # the permutations (rebuilt lazily) instead of inserting row by row
+    REBUILD_FRACTION = 8
+
+    def __init__(self, tracks=()):
+        self.strings = StringTable()
+        self.paths = []
+        self._row_of = {}    # path -> row id
+        self.name_keys = [] # natural_sort_key(filename), computed when the row is added
+        self.titles = array('I')
+        self.artists = array('I')
+        self.exts = array('I')
+        self.durations = array('d')  # milliseconds
+        self.track_numbers = array('i')
+
+        self.sort_key = None # None: rows in the order they were added
+        self._orders = {}    # sort key -> array of row ids in that order
+        self._positions = {} # sort key -> inverse of _orders[sort key]
+        self._search = None  # SearchIndex, built on first search()
+        self._string_rows = None # title/artist string id -> row ids, built on first rank_strings()
+        self.extend(tracks)
+
+    # --- ROWS ---
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __bool__(self):
+        return bool(self.paths)
+
+    def row(self, r):
+        """The Track stored at row id ``r`` (ignores the sort order)."""
+        s = self.strings
+        return Track(self.paths[r], s[self.titles[r]], s[self.artists[r]],
+                     self.durations[r], s[self.exts[r]], self.track_numbers[r])
+
+    def row_id(self, position):
+        """Row id shown at queue ``position`` under the current sort."""
+        order = self._current_order()
+        return position if order is None else order[position]
+
+    def position(self, r):
+        """Queue position of row id ``r`` under the current sort."""
+        positions = self._current_positions()
+        return r if positions is None else positions[r]
+
+    def _current_positions(self):
+        # Inverse of the current permutation (None: rows are in scan order)
+        if self.sort_key is None:
+            return None
+        positions = self._positions.get(self.sort_key)
+        if positions is None:
+            order = self._current_order()
+            positions = array('I', bytes(order.itemsize * len(order)))
+            for i, row in enumerate(order):
+                positions[row] = i
+            self._positions[self.sort_key] = positions
+        return positions
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.row(self.row_id(j)) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("playlist index out of range")
+        return self.row(self.row_id(i))
+
+    def __iter__(self):
+        order = self._current_order()
+        for r in (range(len(self)) if order is None else order):
+            yield self.row(r)
+
+    def __contains__(self, path):
+        return path in self._row_of
+
+    def index_of(self, path):
+        """Queue position of ``path`` under the current sort, or -1 if it isn't queued."""
+        r = self._row_of.get(path)
+        return -1 if r is None else self.position(r)
+
+    def _add_row(self, track):
+        # False if the path is already queued (the existing row is kept)
+        if track.path in self._row_of:
+            return False
+        add = self.strings.add
+        self._row_of[track.path] = len(self.paths)
+        self.paths.append(track.path)
+        self.name_keys.append(natural_sort_key(os.path.basename(track.path)))
+        self.titles.append(add(track.title))
+        self.artists.append(add(track.artist))
+        self.exts.append(add(track.ext))
+        self.durations.append(track.duration or 0)
+        self.track_numbers.append(_track_number(track.track))
+        if self._search is not None:
+            self._search.add_row(len(self.paths) - 1, track.title, track.artist, track.path)
+        self._string_rows = None
+        return True
+
+    def append(self, track):
+        """Add ``track`` unless its path is already queued; returns True if added."""
+        if not self._add_row(track):
+            return False
+        self._insert_rows(range(len(self) - 1, len(self)))
+        return True
+
+    def extend(self, tracks):
+        """Add every track whose path isn't queued yet; returns how many were added."""
+        first = len(self)
+        for t in tracks:
+            self._add_row(t)
+        self._insert_rows(range(first, len(self)))
+        return len(self) - first
+
+    def set_row(self, r, track):
+        self._set_row(r, track)
+        self._reinsert_rows({r})
+
+    def _set_row(self, r, track):
+        add = self.strings.add
+        self._string_rows = None
+        if self._search is not None:
+            s = self.strings
+            self._search.remove_row(r, s[self.titles[r]], s[self.artists[r]], self.paths[r])
+            self._search.add_row(r, track.title, track.artist, track.path)
+        if self.paths[r] != track.path:
+            if track.path in self._row_of:
+                raise ValueError(f"{track.path} is already queued")
+            del self._row_of[self.paths[r]]
+            self._row_of[track.path] = r
+            self.paths[r] = track.path
+            self.name_keys[r] = natural_sort_key(os.path.basename(track.path))
+        self.titles[r] = add(track.title)
+        self.artists[r] = add(track.artist)
+        self.exts[r] = add(track.ext)
+        self.durations[r] = track.duration or 0
+        self.track_numbers[r] = _track_number(track.track)
+
+    def remove_rows(self, rows):
+        """Drop the given row ids; the remaining rows are renumbered in order."""
+        rows = set(rows)
+        if not rows:
+            return
+        keep = [r for r in range(len(self)) if r not in rows]
+        new_id = [-1] * len(self) # old row id -> new one
+        for new, old in enumerate(keep):
+            new_id[old] = new
+        if self._search is not None:
+            # Patch the index in place: rebuilding it re-tokenizes every row
+            s = self.strings
+            for r in rows:
+                self._search.remove_row(r, s[self.titles[r]], s[self.artists[r]], self.paths[r])
+            if min(rows) < len(keep): # Rows removed only from the end keep their ids
+                self._search.renumber(new_id)
+        self.paths = [self.paths[r] for r in keep]
+        self._row_of = {p: r for r, p in enumerate(self.paths)}
+        self.name_keys = [self.name_keys[r] for r in keep]
+        for name in ("titles", "artists", "exts", "durations", "track_numbers"):
+            col = getattr(self, name)
+            setattr(self, name, array(col.typecode, (col[r] for r in keep)))
+        # Removing rows never changes the relative order of the others
+        for key, order in self._orders.items():
+            self._orders[key] = array('I', (new_id[r] for r in order if r not in rows))
+        self._positions.clear()
+        self._string_rows = None
+
+    def remove_paths(self, paths):
+        self.remove_rows(r for r in map(self._row_of.get, paths) if r is not None)
+
+    def apply_rescan(self, diff):
+        # Drop removed rows, swap in re-read ones, append new files
+        self.remove_paths(diff.removed)
+        if diff.modified:
+            changed = set()
+            for t in diff.modified:
+                r = self._row_of.get(t.path)
+                if r is not None:
+                    self._set_row(r, t)
+                    changed.add(r)
+            self._reinsert_rows(changed)
+        self.extend(diff.added)
+
+    # --- SORT PERMUTATIONS ---
+
+    def _row_key(self, sort_key):
+        # Per-row key matching sorted_order; the row id breaks ties so equal
+        # keys keep the order the rows were added in
+        keys = self.strings.keys
+        if sort_key == "Title":
+            return lambda r: (keys[self.titles[r]], r)
+        if sort_key == "Track Number":
+            return lambda r: (self.track_numbers[r], keys[self.titles[r]], r)
+        return lambda r: (self.name_keys[r], r)
+
+    def _current_order(self):
+        if self.sort_key is None:
+            return None
+        order = self._orders.get(self.sort_key)
+        if order is None:
+            order = self._orders[self.sort_key] = array('I', self.sorted_order(self.sort_key))
+        return order
+
+    def _insert_rows(self, rows):
+        if not rows:
+            return
+        self._positions.clear()
+        if len(rows) * self.REBUILD_FRACTION > len(self):
+            self._orders.clear() # Cheaper to re-sort once than to insert one by one
+            return
+        for key, order in self._orders.items():
+            row_key = self._row_key(key)
+            for r in rows:
+                bisect.insort(order, r, key=row_key)
+
+    def _reinsert_rows(self, rows):
+        # Keys of ``rows`` changed: take them out of every permutation and put them back
+        if not rows:
+            return
+        for key, order in self._orders.items():
+            self._orders[key] = array('I', (r for r in order if r not in rows))
+        self._insert_rows(sorted(rows))
+
+    def sort(self, sort_key):
+        """Show the queue in ``sort_key`` order; O(1) once that order was built."""
+        self.sort_key = sort_key
+        self._current_order()
+
+    # --- SEARCH ---
+
+    def build_search_index(self):
+        if self._search is None:
+            index = SearchIndex()
+            s = self.strings
+            for r, path in enumerate(self.paths):
+                index.add_row(r, s[self.titles[r]], s[self.artists[r]], path)
+            self._search = index
+        return self._search
+
+    def search(self, text, limit=None):
+        """Queue positions (current sort) of the rows matching ``text``.
+
+        Every word of ``text`` must prefix a word of the title, artist or
+        filename, ignoring case and accents. Returns None for an empty query,
+        so callers can tell "no filter" from "no match". With ``limit`` only
+        the first ``limit`` positions are returned.
+        """
+        index = self.build_search_index()
+        groups = index.groups(text)
+        if groups is None:
+            return None
+        n = len(self)
+        smallest = sum(map(len, groups[0]))
+        density = 1.0
+        for sets in groups:
+            density *= min(1.0, sum(map(len, sets)) / max(n, 1))
+        if limit is not None and min(n, limit / max(density, 1e-9)) < smallest:
+            # Every word is common: walking the queue finds ``limit`` hits in
+            # fewer steps than checking each row of the smallest group
+            positions = []
+            order = self._current_order()
+            matches = index.matches
+            for i, r in enumerate(range(len(self)) if order is None else order):
+                if matches(groups, r):
+                    positions.append(i)
+                    if len(positions) == limit:
+                        break
+            return positions
+        rows = index.rows(groups)
+        inverse = self._current_positions()
+        positions = sorted(rows if inverse is None else map(inverse.__getitem__, rows))
+        return positions if limit is None else positions[:limit]
+
+    def rank_strings(self, scores, limit=None):
+        """Queue positions of rows whose title or artist is scored, best first.
+
+        ``scores`` is an iterable of ``(text, score)`` such as
+        ``MetadataCache.fuzzy_search`` returns. A row takes the better score of
+        its title and artist; equal scores keep queue order.
+        """
+        if self._string_rows is None:
+            string_rows = {}
+            for col in (self.titles, self.artists):
+                for r, i in enumerate(col):
+                    string_rows.setdefault(i, set()).add(r)
+            self._string_rows = string_rows
+        best = {}
+        for text, score in scores:
+            for r in self._string_rows.get(self.strings.id_of(text), ()):
+                if score > best.get(r, 0):
+                    best[r] = score
+        ranked = sorted((-score, self.position(r)) for r, score in best.items())
+        return [p for _, p in ranked[:limit]]
+
+    # --- COLUMN QUERIES ---
+
+    def _string_ranks(self, ids):
+        # Sort the distinct strings by their cached keys, then compare rows by
+        # rank. Strings with equal keys ("A"/"a") share a rank so ties stay stable.
+        keys = self.strings.keys
+        rank = [0] * len(keys)
+        r = -1
+        prev = None
+        for i in sorted(range(len(keys)), key=keys.__getitem__):
+            if keys[i] != prev:
+                r += 1
+                prev = keys[i]
+            rank[i] = r
+        if np is not None:
+            return np.asarray(rank, dtype=np.int64)[np.frombuffer(ids, dtype=np.uint32)]
+        return [rank[i] for i in ids]
+
+    def sorted_order(self, sort_key):
+        """Row ids in the order of the "File Name / Title / Track Number" dropdown."""
+        n = len(self)
+        if sort_key == "Title":
+            keys = self._string_ranks(self.titles)
+            if np is not None:
+                return np.argsort(keys, kind="stable").tolist()
+            return sorted(range(n), key=keys.__getitem__)
+        if sort_key == "Track Number":
+            # Primary sort: Track Number, Secondary: Title
+            title_rank = self._string_ranks(self.titles)
+            if np is not None:
+                return np.lexsort((title_rank, np.frombuffer(self.track_numbers, dtype=np.int32))).tolist()
+            nums = self.track_numbers
+            return sorted(range(n), key=lambda i: (nums[i], title_rank[i]))
+        return sorted(range(n), key=self.name_keys.__getitem__)
+
+    def total_duration(self):
+        if np is not None:
+            return float(np.frombuffer(self.durations, dtype=np.float64).sum())
+        return sum(self.durations)
+
+    def filter_indices(self, artist=None, ext=None, min_duration=None, max_duration=None):
+        """Queue positions (current sort) matching every given criterion (exact artist/ext match)."""
+        n = len(self)
+        if np is not None:
+            mask = np.ones(n, dtype=bool)
+            if artist is not None:
+                mask &= np.frombuffer(self.artists, dtype=np.uint32) == self.strings.id_of(artist)
+            if ext is not None:
+                mask &= np.frombuffer(self.exts, dtype=np.uint32) == self.strings.id_of(ext)
+            durations = np.frombuffer(self.durations, dtype=np.float64)
+            if min_duration is not None:
+                mask &= durations >= min_duration
+            if max_duration is not None:
+                mask &= durations <= max_duration
+            rows = np.flatnonzero(mask).tolist()
+        else:
+            artist_id = self.strings.id_of(artist) if artist is not None else None
+            ext_id = self.strings.id_of(ext) if ext is not None else None
+            rows = [i for i in range(n)
+                    if (artist_id is None or self.artists[i] == artist_id)
+                    and (ext_id is None or self.exts[i] == ext_id)
+                    and (min_duration is None or self.durations[i] >= min_duration)
+                    and (max_duration is None or self.durations[i] <= max_duration)]
+        return sorted(self.position(r) for r in rows)
@@ -0,0 +1,95 @@
+import os
+import sys
+import threading
+
+PREFETCH_DELAY = 0.5 # seconds the track that just started has the disk to itself
+PREFETCH_NICE = 10 # Scheduling priority of the worker thread where that can be set per thread
+
+
+def _lower_thread_priority():
+    # Linux (and Android) schedule threads individually, so setpriority on the
+    # thread id only affects this thread. Elsewhere it would renice the whole
+    # app, so leave it; the start delay and the single thread still apply.
+    if sys.platform not in ("linux", "android"):
+        return
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), PREFETCH_NICE)
+    except (AttributeError, OSError):
+        pass
+
+
+class Prefetcher:
+    """Warms caches for upcoming tracks on one low-priority background thread.
+
+    ``schedule(paths, budget)`` replaces whatever job is pending or running:
+    after PREFETCH_DELAY the worker calls ``warm(path)`` on each path in order,
+    most likely next first. ``warm`` returns how many bytes it now holds in
+    memory for that path; once ``budget`` is used up the rest of the list is
+    dropped. A newer ``schedule`` or ``cancel`` stops the current job between
+    two paths. ``done()``, if given, runs on the worker after a job that wasn't
+    stopped that way.
+    """
+
+    def __init__(self, warm, delay=PREFETCH_DELAY, done=None):
+        self._warm = warm
+        self._done = done
+        self.delay = delay
+        self.warmed = 0 # Paths warmed since start
+        self._cond = threading.Condition()
+        self._job = None # (generation, paths, budget) waiting for the worker
+        self._generation = 0
+        self._closed = False
+        self._thread = None
+
+    def schedule(self, paths, budget):
+        with self._cond:
+            self._generation += 1
+            self._job = (self._generation, list(paths), budget)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="prefetch", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def cancel(self):
+        with self._cond:
+            self._generation += 1
+            self._job = None
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._job = None
+            self._cond.notify()
+
+    def _stale(self, generation):
+        return self._closed or generation != self._generation
+
+    def _run(self):
+        _lower_thread_priority()
+        while True:
+            with self._cond:
+                while self._job is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                generation, paths, budget = self._job
+                self._job = None
+                # Skipping through tracks reschedules within the delay; only the last job runs
+                if self._cond.wait_for(lambda: self._stale(generation), timeout=self.delay):
+                    continue
+
+            spent = 0
+            for path in paths:
+                if spent >= budget or self._stale(generation):
+                    break
+                try:
+                    spent += self._warm(path) or 0
+                    self.warmed += 1
+                except Exception as e:
+                    print(f"Prefetch of {os.path.basename(path)} failed: {e}")
+            if self._done is not None and not self._stale(generation):
+                try:
+                    self._done()
+                except Exception as e:
+                    print(f"Prefetch completion failed: {e}")
@@ -0,0 +1,125 @@
+from collections import deque
+import functools
+import json
+import os
+import threading
+import time
+
+from storage import app_data_path
+
+# Upper bounds (ms) of the histogram buckets; anything slower lands in "inf"
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+WINDOW = 500 # Samples kept per measured name
+
+
+def default_dump_path():
+    return app_data_path("render_stats.json")
+
+
+class RenderStats:
+    """Rolling timings of UI refreshes.
+
+    Each measured call records its wall time, the number of Flet controls
+    constructed during it and an approximate payload: the size of the
+    control properties set while it ran (what the next update has to send).
+    The last ``WINDOW`` samples per name are kept and summarized as
+    percentiles and a latency histogram, for the debug overlay and
+    ``dump_json``.
+
+    Control/payload counting needs ``hook_flet``; without it those columns
+    stay at 0. Counters are global, so a nested measurement (page.update
+    inside update_main_view) is included in its parent's numbers.
+    """
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.samples = {} # name -> deque of (ms, controls, payload_bytes)
+        self.controls_created = 0
+        self.payload_bytes = 0
+        self._lock = threading.Lock()
+
+    def hook_flet(self, ft):
+        # Count control construction and property writes by wrapping flet's
+        # Control base class. Property writes go through _set_attr_internal in
+        # flet's Python controls; if a version lacks it, payload stays 0.
+        stats = self
+        control = ft.Control
+        init = control.__init__
+
+        @functools.wraps(init)
+        def counting_init(self, *args, **kwargs):
+            stats.controls_created += 1
+            init(self, *args, **kwargs)
+        control.__init__ = counting_init
+
+        set_attr = getattr(control, "_set_attr_internal", None)
+        if set_attr is not None:
+            @functools.wraps(set_attr)
+            def counting_set_attr(self, name, value, *args, **kwargs):
+                if value is not None:
+                    stats.payload_bytes += len(name) + len(str(value))
+                return set_attr(self, name, value, *args, **kwargs)
+            control._set_attr_internal = counting_set_attr
+
+    def record(self, name, ms, controls=0, payload=0):
+        with self._lock:
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = deque(maxlen=self.window)
+            samples.append((ms, controls, payload))
+
+    def measure(self, name):
+        """Decorator: time every call of the wrapped function under ``name``."""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                created, payload = self.controls_created, self.payload_bytes
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record(name, (time.perf_counter() - start) * 1000,
+                                self.controls_created - created, self.payload_bytes - payload)
+            return wrapper
+        return decorate
+
+    def summary(self):
+        with self._lock:
+            snapshot = {name: list(samples) for name, samples in self.samples.items()}
+        out = {}
+        for name, samples in snapshot.items():
+            times = sorted(s[0] for s in samples)
+            n = len(times)
+            histogram = dict.fromkeys([str(b) for b in BUCKETS_MS] + ["inf"], 0)
+            for ms in times:
+                for bound in BUCKETS_MS:
+                    if ms <= bound:
+                        histogram[str(bound)] += 1
+                        break
+                else:
+                    histogram["inf"] += 1
+            out[name] = {
+                "count": n,
+                "mean_ms": sum(times) / n,
+                "p50_ms": times[n // 2],
+                "p95_ms": times[min(n - 1, int(n * 0.95))],
+                "max_ms": times[-1],
+                "controls_mean": sum(s[1] for s in samples) / n,
+                "payload_bytes_mean": sum(s[2] for s in samples) / n,
+                "histogram_ms": histogram,
+            }
+        return out
+
+    def overlay_text(self):
+        lines = []
+        for name, s in sorted(self.summary().items()):
+            lines.append(f"{name:<17} n={s['count']:<4} p50 {s['p50_ms']:6.1f}  p95 {s['p95_ms']:6.1f}  "
+                         f"max {s['max_ms']:6.1f} ms  ctl {s['controls_mean']:5.0f}  ~{s['payload_bytes_mean'] / 1024:6.1f} KB")
+        return "\n".join(lines) or "No renders recorded yet"
+
+    def dump_json(self, path=None):
+        path = path or default_dump_path()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"created": time.time(), "buckets_ms": BUCKETS_MS, "stats": self.summary()}, f, indent=2)
+        return path
@@ -0,0 +1,318 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import asyncio
+import os
+import threading
+import time
+
+from metadata import extract_metadata
+from walker import LibraryWalker, walk_audio_files
+
+# TinyTag spends most of its time waiting on disk, so a few more threads than
+# cores keeps the drive busy (same default as ThreadPoolExecutor itself).
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+
+class ScanStats:
+    """Timing summary of a single scan run."""
+
+    def __init__(self, files=0, seconds=0.0, workers=1):
+        self.files = files
+        self.seconds = seconds
+        self.workers = workers
+
+    @property
+    def files_per_second(self):
+        return self.files / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self):
+        return (f"{self.files} files in {self.seconds:.2f}s "
+                f"({self.files_per_second:.1f} files/s, {self.workers} workers)")
+
+
+class ScanCancelled(Exception):
+    pass
+
+
+class ScanJob:
+    """Live progress and cancellation handle for one folder scan.
+
+    Counters are written by the scan threads and may be read at any time
+    (e.g. by a UI ticker). ``cancel()`` is safe to call from any thread; the
+    scan stops at the next file and raises ``ScanCancelled``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.walker = LibraryWalker()
+        self.files_queued = 0   # matched files that need parsing (all of them on a full scan)
+        self.files_parsed = 0
+        self.bytes_parsed = 0 # total size of the files parsed, not bytes read: headers only, cache hits nothing
+        self.walk_done = False
+        self.started = time.perf_counter()
+        self.finished = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    # --- CONTROL ---
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        if self._cancel.is_set():
+            raise ScanCancelled(self.path)
+
+    def done(self):
+        self.finished = time.perf_counter()
+
+    def track(self, extract, sizes):
+        # Wraps an extract function so every parsed file bumps the counters
+        def parse(file_path):
+            self.check()
+            track = extract(file_path)
+            with self._lock:
+                self.files_parsed += 1
+                self.bytes_parsed += sizes.get(file_path, 0)
+            return track
+        return parse
+
+    # --- PROGRESS ---
+
+    @property
+    def dirs_visited(self):
+        return self.walker.dirs_visited
+
+    @property
+    def files_matched(self):
+        return self.walker.files_matched
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def fraction(self):
+        # None while the walk is still discovering files (total unknown)
+        if not self.walk_done:
+            return None
+        if not self.files_queued:
+            return 1.0
+        return min(1.0, self.files_parsed / self.files_queued)
+
+    @property
+    def eta(self):
+        """Seconds left, or None until the walk has finished and parsing started."""
+        if not self.walk_done or not self.files_parsed:
+            return None
+        rate = self.files_parsed / self.elapsed
+        return max(0.0, (self.files_queued - self.files_parsed) / rate)
+
+    def __str__(self):
+        text = (f"{self.dirs_visited} folders, {self.files_matched} found, "
+                f"{self.files_parsed} parsed ({self.bytes_parsed / 1048576:.0f} MB of audio)")
+        eta = self.eta
+        if eta is not None and self.finished is None:
+            text += f", ~{int(eta) // 60}:{int(eta) % 60:02d} left"
+        return text
+
+
+def iter_audio_files(path):
+    # Same order as the old os.walk loop, minus hidden/NAS/trash folders
+    for f in walk_audio_files(path):
+        yield f.path
+
+
+def find_audio_files(path):
+    return list(iter_audio_files(path))
+
+
+def iter_metadata(paths, workers=DEFAULT_WORKERS, extract=extract_metadata):
+    """Yield extract(path) for every path, in input order.
+
+    At most ``workers * 4`` files are in flight at once, so memory stays flat
+    no matter how many paths are fed in.
+    """
+    workers = max(1, int(workers or 1))
+    if workers == 1:
+        for p in paths:
+            yield extract(p)
+        return
+
+    window = workers * 4
+    pending = deque()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan")
+    try:
+        for p in paths:
+            pending.append(pool.submit(extract, p))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Early exit (cancel, error, generator closed): drop queued work
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def scan_files(paths, workers=DEFAULT_WORKERS, extract=extract_metadata):
+    """Extract metadata for ``paths`` on a thread pool.
+
+    Returns ``(tracks, stats)`` where ``tracks`` is in the same order as
+    ``paths``.
+    """
+    start = time.perf_counter()
+    tracks = list(iter_metadata(paths, workers=workers, extract=extract))
+    stats = ScanStats(len(tracks), time.perf_counter() - start, max(1, int(workers or 1)))
+    return tracks, stats
+
+
+def scan_folder(path, workers=DEFAULT_WORKERS, extract=extract_metadata):
+    """Walk ``path`` and extract metadata for every supported audio file."""
+    return scan_files(find_audio_files(path), workers=workers, extract=extract)
+
+
+# --- STREAMING SCAN ---
+
+async def stream_folder(path, workers=DEFAULT_WORKERS, extract=extract_metadata,
+                        batch_size=256, batch_interval=0.5, job=None, state=None):
+    """Async generator yielding lists of Tracks while ``path`` is scanned.
+
+    The walk and metadata extraction run on a background thread and overlap,
+    so the first track is yielded (as a batch of one) as soon as it has been
+    read. Later batches are flushed every ``batch_size`` tracks or
+    ``batch_interval`` seconds, whichever comes first. Tracks arrive in walk
+    order; sorting is left to the caller. Closing the generator early (or
+    cancelling ``job``) stops the scan. If given, the ``state`` dict is filled
+    with path -> (size, mtime_ns) from the walk, ready for ``rescan_folder``.
+    """
+    job = job or ScanJob(path)
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+    sizes = {}
+
+    def to_parse():
+        for f in job.walker.walk(path):
+            job.check()
+            sizes[f.path] = f.size
+            if state is not None:
+                state[f.path] = (f.size, f.mtime_ns)
+            job.files_queued += 1
+            yield f.path
+        job.walk_done = True
+
+    def post(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            # Event loop already closed (app shutting down)
+            job.cancel()
+
+    def produce():
+        batch = []
+        last_flush = time.perf_counter()
+        first = True
+        try:
+            for track in iter_metadata(to_parse(), workers=workers, extract=job.track(extract, sizes)):
+                job.check()
+                batch.append(track)
+                now = time.perf_counter()
+                if first or len(batch) >= batch_size or now - last_flush >= batch_interval:
+                    post(batch)
+                    batch = []
+                    last_flush = now
+                    first = False
+            if batch:
+                post(batch)
+        except ScanCancelled:
+            pass
+        except Exception as err:
+            post(err)
+        finally:
+            job.done()
+            post(done)
+
+    producer = threading.Thread(target=produce, name="scan-stream", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        if job.finished is None:
+            job.cancel() # Consumer left early: stop the producer thread
+
+
+# --- INCREMENTAL RESCAN ---
+
+class ScanDiff:
+    """Result of comparing a folder with the state of the previous scan.
+
+    ``state`` maps every audio file currently on disk to ``(size, mtime_ns)``
+    and should be kept for the next rescan.
+    """
+
+    def __init__(self):
+        self.added = []     # Tracks for new files
+        self.modified = []  # Tracks for files whose size or mtime changed
+        self.removed = []   # paths that no longer exist
+        self.state = {}
+        self.stats = None
+
+    def __bool__(self):
+        return bool(self.added or self.modified or self.removed)
+
+    def __str__(self):
+        return f"+{len(self.added)} ~{len(self.modified)} -{len(self.removed)}"
+
+
+def rescan_folder(path, known_state, workers=DEFAULT_WORKERS, extract=extract_metadata, job=None):
+    """Re-read only the files under ``path`` that are new or changed since
+    ``known_state`` (a previous ``ScanDiff.state``, or ``{}`` for a full scan).
+
+    The walk feeds the metadata pool directly, so parsing starts with the
+    first file found. Pass a ``ScanJob`` to watch progress or cancel; a
+    cancelled scan raises ``ScanCancelled`` and returns nothing.
+    """
+    job = job or ScanJob(path)
+    diff = ScanDiff()
+    is_new = {}
+    sizes = {}
+
+    def to_parse():
+        # The walker already has size/mtime from scandir, no second stat pass
+        for f in job.walker.walk(path):
+            job.check()
+            sig = (f.size, f.mtime_ns)
+            diff.state[f.path] = sig
+            old = known_state.get(f.path)
+            if old == sig:
+                continue
+            is_new[f.path] = old is None
+            sizes[f.path] = f.size
+            job.files_queued += 1
+            yield f.path
+        job.walk_done = True
+
+    start = time.perf_counter()
+    try:
+        for track in iter_metadata(to_parse(), workers=workers, extract=job.track(extract, sizes)):
+            job.check()
+            if is_new[track.path]:
+                diff.added.append(track)
+            else:
+                diff.modified.append(track)
+    finally:
+        job.done()
+
+    diff.removed = [p for p in known_state if p not in diff.state]
+    diff.stats = ScanStats(job.files_parsed, time.perf_counter() - start, max(1, int(workers or 1)))
+    return diff
@@ -0,0 +1,148 @@
+from bisect import bisect_left
+import os
+import re
+
+from metadata import fold_text
+
+_WORDS = re.compile(r'[^\W_]+') # "Artist_Name - 01 Song" -> artist, name, 01, song
+
+SHORT_PREFIX = 2 # Prefixes up to this length get their own posting sets
+MAX_GROUP_SETS = 8 # A term matching more words than this gets their sets merged
+
+
+def tokenize(text):
+    return _WORDS.findall(fold_text(text))
+
+
+class SearchIndex:
+    """Prefix index over the title, artist and filename of every playlist row.
+
+    Every folded word maps to the set of row ids containing it. A query term
+    matches any word it is a prefix of. The words are kept sorted, so a term's
+    matches are a bisect range. One- and two-letter prefixes, whose ranges would
+    cover most of the vocabulary, have their own posting sets filled at add
+    time. A row matches a query if it matches every term.
+
+    Rows can be added and removed one at a time. The sorted word list is
+    re-sorted lazily on the first query after new words came in. Titles and
+    artists repeat a lot, so their words are tokenized once per distinct string.
+    """
+
+    def __init__(self):
+        self.postings = {} # word -> set of row ids
+        self.short = {}    # 1-2 letter prefix -> set of row ids
+        self._words = []   # sorted keys of postings
+        self._dirty = False
+        self._tokens = {}  # title/artist string -> its words
+
+    def _string_words(self, s):
+        words = self._tokens.get(s)
+        if words is None:
+            words = self._tokens[s] = tuple(tokenize(s))
+        return words
+
+    def row_words(self, title, artist, path):
+        words = set(self._string_words(title))
+        words.update(self._string_words(artist))
+        words.update(tokenize(os.path.basename(path)))
+        return words
+
+    def add_row(self, r, title, artist, path):
+        postings, short = self.postings, self.short
+        for word in self.row_words(title, artist, path):
+            rows = postings.get(word)
+            if rows is None:
+                rows = postings[word] = set()
+                self._dirty = True
+            rows.add(r)
+            for n in range(1, min(SHORT_PREFIX, len(word)) + 1):
+                prefix = word[:n]
+                rows = short.get(prefix)
+                if rows is None:
+                    rows = short[prefix] = set()
+                rows.add(r)
+
+    def remove_row(self, r, title, artist, path):
+        for word in self.row_words(title, artist, path):
+            rows = self.postings.get(word)
+            if rows is not None:
+                rows.discard(r)
+            for n in range(1, min(SHORT_PREFIX, len(word)) + 1):
+                rows = self.short.get(word[:n])
+                if rows is not None:
+                    rows.discard(r)
+
+    def renumber(self, new_id):
+        """Map every row id through ``new_id`` (list: old id -> new id of each remaining row).
+
+        For after rows were removed and the rest renumbered; the removed rows
+        must have been taken out with ``remove_row`` first. Moves ids between
+        sets without tokenizing anything again.
+        """
+        get = new_id.__getitem__
+        for table in (self.postings, self.short):
+            for key, rows in list(table.items()):
+                if rows:
+                    table[key] = set(map(get, rows))
+                else:
+                    del table[key] # Last row with this word is gone
+        self._dirty = True
+
+    def _term_sets(self, term):
+        # Posting sets of every word ``term`` is a prefix of
+        if len(term) <= SHORT_PREFIX:
+            rows = self.short.get(term)
+            return [rows] if rows else []
+        if self._dirty:
+            self._words = sorted(self.postings)
+            self._dirty = False
+        words = self._words
+        i = bisect_left(words, term)
+        j = bisect_left(words, term + "\U0010ffff", i)
+        sets = [self.postings[w] for w in words[i:j]]
+        if len(sets) > MAX_GROUP_SETS:
+            merged = set()
+            merged.update(*sets)
+            sets = [merged]
+        return sets
+
+    def groups(self, text):
+        """One group of posting sets per query word, smallest first.
+
+        A row matches a word if it is in any set of the word's group, and the
+        query if it matches every group. Returns None for an empty query. The
+        sets belong to the index: read them, don't modify them.
+        """
+        terms = set(tokenize(text))
+        if not terms:
+            return None
+        groups = [self._term_sets(t) for t in terms]
+        groups.sort(key=lambda sets: sum(map(len, sets)))
+        return groups
+
+    @staticmethod
+    def matches(groups, r):
+        for sets in groups:
+            for rows in sets:
+                if r in rows:
+                    break
+            else:
+                return False
+        return True
+
+    def rows(self, groups):
+        """All row ids matching ``groups`` (candidates come from the smallest group)."""
+        if not groups[0]:
+            return set()
+        candidates = set()
+        candidates.update(*groups[0])
+        if len(groups) == 1:
+            return candidates
+        rest = groups[1:]
+        matches = self.matches
+        return {r for r in candidates if matches(rest, r)}
+
+    def query(self, text):
+        """Row ids matching every word of ``text`` as a prefix; None for an empty query."""
+        groups = self.groups(text)
+        return None if groups is None else self.rows(groups)
@@ -0,0 +1,14 @@
+import os
+
+
+def app_data_dir():
+    """Directory for the app's own files (caches, indexes, stats dumps).
+
+    Flet sets FLET_APP_STORAGE_DATA for packaged apps (Android/iOS/desktop
+    builds); running from source falls back to ~/.hires_player.
+    """
+    return os.environ.get("FLET_APP_STORAGE_DATA") or os.path.join(os.path.expanduser("~"), ".hires_player")
+
+
+def app_data_path(name):
+    return os.path.join(app_data_dir(), name)
@@ -0,0 +1,37 @@
+import os
+import sys
+
+
+class Track:
+    """One playlist entry.
+
+    Replaces the old 7-key dict: ``__slots__`` drops the per-instance
+    ``__dict__``, ``ext`` and ``artist`` are interned so every track of an
+    album/format shares one string, and ``filename`` is derived from ``path``
+    instead of being stored.
+    """
+
+    __slots__ = ("path", "title", "artist", "duration", "ext", "track")
+
+    def __init__(self, path, title, artist="Unknown Artist", duration=0, ext="", track=0):
+        self.path = path
+        self.title = title
+        self.artist = sys.intern(artist)
+        self.duration = duration  # milliseconds
+        self.ext = sys.intern(ext)
+        self.track = track
+
+    @property
+    def filename(self):
+        return os.path.basename(self.path)
+
+    def __eq__(self, other):
+        if not isinstance(other, Track):
+            return NotImplemented
+        return (self.path, self.title, self.artist, self.duration, self.ext, self.track) == \
+               (other.path, other.title, other.artist, other.duration, other.ext, other.track)
+
+    __hash__ = None # Mutable record
+
+    def __repr__(self):
+        return f"Track({self.path!r}, {self.title!r}, {self.artist!r}, {self.duration!r}, {self.ext!r}, {self.track!r})"
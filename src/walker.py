@@ -0,0 +1,145 @@
+from collections import namedtuple
+import os
+
+from metadata import SUPPORTED_EXT
+
+# Directory names that never hold music worth scanning: NAS thumbnail stores,
+# trash folders and OS metadata. Anything starting with "." is skipped too.
+IGNORED_DIRS = frozenset({
+    "@eaDir",
+    "#recycle",
+    "$RECYCLE.BIN",
+    "System Volume Information",
+    "lost+found",
+})
+
+AudioFile = namedtuple("AudioFile", "path size mtime_ns")
+
+
+class LibraryWalker:
+    """os.scandir based replacement for the os.walk loop in on_folder_picked.
+
+    * Only audio files are stat'ed, and their full path comes from
+      ``DirEntry.path``, so non-audio files cost one ``endswith`` each.
+    * Size/mtime come from ``DirEntry.stat()`` (free on Windows, one cached
+      call elsewhere) and are handed to the caller instead of being re-read.
+    * Hidden and ``IGNORED_DIRS`` directories are pruned before descending.
+    * Symlinked directories are followed after the real tree, and only if
+      their resolved path is not inside a tree already walked. That breaks
+      symlink cycles and keeps the real path when a folder is reachable twice.
+    * Symlinked files pointing into a walked tree and extra hard links
+      (st_nlink > 1, same st_dev/st_ino) are reported once. Windows does not
+      expose link counts through scandir, so hard links are not deduped there.
+
+    Without symlinks the order matches os.walk (top-down, files of a
+    directory before its subdirectories, both in scandir order). Counters are updated as the walk
+    runs so they can be read from another thread for progress reporting.
+    """
+
+    def __init__(self, extensions=SUPPORTED_EXT, ignored_dirs=IGNORED_DIRS,
+                 skip_hidden=True, follow_symlinks=True):
+        self.extensions = tuple(e.lower() for e in extensions)
+        self.ignored_dirs = frozenset(ignored_dirs)
+        self.skip_hidden = skip_hidden
+        self.follow_symlinks = follow_symlinks
+
+        self.dirs_visited = 0
+        self.files_seen = 0
+        self.files_matched = 0
+        self.bytes_matched = 0
+        self.dirs_pruned = 0
+        self.duplicates = 0
+
+    def _prune(self, name):
+        if self.skip_hidden and name.startswith("."):
+            return True
+        return name in self.ignored_dirs
+
+    @staticmethod
+    def _covered(real, trees):
+        # True if the resolved path lies inside one of the walked trees
+        for tree in trees:
+            # join(tree, "") adds the separator unless tree already ends with one ("/", "C:\\")
+            if real == tree or real.startswith(os.path.join(tree, "")):
+                return True
+        return False
+
+    def walk(self, root):
+        """Yield an ``AudioFile`` for every supported file under ``root``."""
+        exts = tuple(self.extensions)
+        follow = self.follow_symlinks
+        prune = self._prune
+        seen_links = set() # (st_dev, st_ino) of hard-linked files already yielded
+
+        try:
+            walked = [os.path.realpath(root)] # Real paths of every tree walked so far
+            os.stat(root)
+        except OSError as err:
+            print(f"Cannot scan {root}: {err}")
+            return
+
+        stack = [root]
+        linked = [] # Symlinked dirs, walked after the real tree so real paths win
+        while stack or linked:
+            if not stack:
+                # A link back into anything already walked (including an
+                # ancestor, i.e. a cycle) resolves inside ``walked``
+                path = linked.pop(0)
+                real = os.path.realpath(path)
+                if self._covered(real, walked):
+                    self.dirs_pruned += 1
+                    continue
+                walked.append(real)
+                stack.append(path)
+
+            current = stack.pop()
+            try:
+                it = os.scandir(current)
+            except OSError:
+                continue # Unreadable directory, same as os.walk's default
+            self.dirs_visited += 1
+
+            subdirs = []
+            with it:
+                for entry in it:
+                    name = entry.name
+                    try:
+                        if entry.is_dir(follow_symlinks=follow):
+                            if prune(name):
+                                self.dirs_pruned += 1
+                            elif entry.is_symlink():
+                                linked.append(entry.path)
+                            else:
+                                subdirs.append(entry.path)
+                            continue
+
+                        self.files_seen += 1
+                        if not name.lower().endswith(exts):
+                            continue
+                        st = entry.stat()
+                        if entry.is_symlink():
+                            # Link to a file inside a walked tree: the real
+                            # file is reported under its own path instead
+                            if self._covered(os.path.realpath(entry.path), walked):
+                                self.duplicates += 1
+                                continue
+                    except OSError:
+                        continue # Broken symlink or entry vanished mid-walk
+
+                    if st.st_nlink > 1:
+                        key = (st.st_dev, st.st_ino)
+                        if key in seen_links:
+                            self.duplicates += 1
+                            continue
+                        seen_links.add(key)
+
+                    self.files_matched += 1
+                    self.bytes_matched += st.st_size
+                    yield AudioFile(entry.path, st.st_size, st.st_mtime_ns)
+
+            # Reverse so the first subdirectory is walked next, like os.walk
+            stack.extend(reversed(subdirs))
+
+
+def walk_audio_files(root, **kwargs):
+    return LibraryWalker(**kwargs).walk(root)